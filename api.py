@@ -1,31 +1,70 @@
+import asyncio
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from io import BytesIO
+from functools import partial
 import os
-from typing import List
+from typing import Any, AsyncIterator, BinaryIO, Callable, List
 
 from fastapi import Depends, FastAPI, File, HTTPException, UploadFile, status
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from PIL import Image, UnidentifiedImageError
+from PIL import UnidentifiedImageError
 from pydantic import BaseModel, Field
+import torch
 
 from src.auth import (
     AuthRepository,
     User,
-    create_access_token,
-    create_refresh_token,
+    create_token_pair,
     decode_access_token,
 )
-from src.classifier import analyze_image
+from src.batching import InferenceBatcher, probe_max_batch_size
+from src.classifier import (
+    analyze_images,
+    decode_image,
+    preprocess_image,
+    summarize_predictions,
+    top_predictions,
+    validate_analysis_params,
+)
 from src.history import HistoryRepository
-from src.media import analyze_video_bytes
-from src.translation import translate_label
+from src.media import analyze_video_stream
+from src.translation import get_translation_table
 from src.url_analyzer import analyze_url
 
-app = FastAPI(title="Multimedia Recognition API", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    batcher.start()
+    yield
+    # Urutan penting: worker batcher dihentikan dulu sebelum executor yang
+    # dipakainya ditutup, lalu koneksi database.
+    await batcher.stop()
+    inference_executor.shutdown(wait=True)
+    repo.close()
+    auth_repo.close()
+
+
+app = FastAPI(
+    title="Multimedia Recognition API",
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
 DB_PATH = os.getenv("APP_DB_PATH", "history.db")
 repo = HistoryRepository(DB_PATH)
 auth_repo = AuthRepository(DB_PATH)
 security = HTTPBearer(auto_error=False)
+inference_executor = ThreadPoolExecutor(
+    max_workers=os.cpu_count() or 1,
+    thread_name_prefix="inference",
+)
+batcher = InferenceBatcher(
+    executor=inference_executor,
+    max_batch_size=probe_max_batch_size(int(os.getenv("APP_MAX_BATCH_SIZE", "16"))),
+    max_wait_ms=float(os.getenv("APP_BATCH_TIMEOUT_MS", "5")),
+)
 
 
 class RegisterRequest(BaseModel):
@@ -56,7 +95,19 @@ class URLPredictRequest(BaseModel):
     media_type: str = Field(default="auto", pattern="^(auto|image|video)$")
 
 
-def _decode_and_validate_token(token: str, expected_type: str) -> dict:
+# Repository diambil lewat dependency agar test bisa menggantinya dengan
+# app.dependency_overrides tanpa me-reload modul ini.
+def get_history_repo() -> HistoryRepository:
+    return repo
+
+
+def get_auth_repo() -> AuthRepository:
+    return auth_repo
+
+
+def _decode_and_validate_token(
+    token: str, expected_type: str, auth: AuthRepository
+) -> dict:
     try:
         payload = decode_access_token(token)
     except Exception:
@@ -73,7 +124,7 @@ def _decode_and_validate_token(token: str, expected_type: str) -> dict:
         )
 
     jti = payload.get("jti")
-    if jti and auth_repo.is_token_revoked(jti):
+    if jti and auth.is_token_revoked(jti):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token sudah tidak aktif",
@@ -83,17 +134,23 @@ def _decode_and_validate_token(token: str, expected_type: str) -> dict:
 
 def get_access_payload(
     credentials: HTTPAuthorizationCredentials | None = Depends(security),
+    auth: AuthRepository = Depends(get_auth_repo),
 ) -> dict:
+    # Dependency FastAPI di-cache per request, jadi decode dan cek revocation
+    # hanya terjadi sekali walau dipakai beberapa dependency.
     if credentials is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token dibutuhkan",
         )
-    return _decode_and_validate_token(credentials.credentials, "access")
+    return _decode_and_validate_token(credentials.credentials, "access", auth)
 
 
-def get_current_user(payload: dict = Depends(get_access_payload)) -> User:
-    user = auth_repo.get_user_by_id(int(payload["sub"]))
+def get_current_user(
+    payload: dict = Depends(get_access_payload),
+    auth: AuthRepository = Depends(get_auth_repo),
+) -> User:
+    user = auth.get_user_by_id(int(payload["sub"]))
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -118,26 +175,61 @@ def parse_iso8601(value: str, field_name: str) -> datetime:
         )
 
 
-def _to_response_rows(predictions: list, language: str) -> list[dict]:
+async def run_blocking(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run CPU-bound work on the bounded inference pool, off the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(inference_executor, partial(func, *args, **kwargs))
+
+
+def _decode_and_preprocess(source: BinaryIO) -> torch.Tensor:
+    return preprocess_image(decode_image(source))
+
+
+def _round_predictions(predictions: list) -> list[tuple[str, float]]:
+    return [(item.label, round(item.confidence, 2)) for item in predictions]
+
+
+def _to_response_rows(rounded: list[tuple[str, float]], language: str) -> list[dict]:
+    table = get_translation_table(language)
     return [
         {
-            "label": translate_label(item.label, language=language),
-            "label_raw": item.label,
-            "confidence": round(item.confidence, 2),
+            "label": table.get(label, label),
+            "label_raw": label,
+            "confidence": confidence,
         }
-        for item in predictions
+        for label, confidence in rounded
     ]
 
 
+def _visible_rows(
+    rounded: list[tuple[str, float]], filtered: list, language: str
+) -> list[dict]:
+    # Prediksi terurut menurun, jadi hasil filter min_conf selalu prefix.
+    visible = rounded[: len(filtered)] if filtered else rounded
+    return _to_response_rows(visible, language)
+
+
+def _history_predictions(rounded: list[tuple[str, float]]) -> list[dict]:
+    return [{"label": label, "confidence": confidence} for label, confidence in rounded]
+
+
 @app.get("/health")
 def health() -> dict:
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+def metrics() -> dict:
+    return batcher.metrics()
+
+
 @app.post("/auth/register")
-def register(payload: RegisterRequest) -> dict:
+def register(
+    payload: RegisterRequest,
+    auth: AuthRepository = Depends(get_auth_repo),
+) -> dict:
     try:
-        user = auth_repo.create_user(
+        user = auth.create_user(
             username=payload.username,
             password=payload.password,
             role=payload.role,
@@ -145,8 +237,7 @@ def register(payload: RegisterRequest) -> dict:
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc))
 
-    token = create_access_token(user_id=user["id"], role=user["role"])
-    refresh_token = create_refresh_token(user_id=user["id"], role=user["role"])
+    token, refresh_token = create_token_pair(user_id=user["id"], role=user["role"])
     return {
         "user": user,
         "access_token": token,
@@ -156,13 +247,15 @@ def register(payload: RegisterRequest) -> dict:
 
 
 @app.post("/auth/login")
-def login(payload: LoginRequest) -> dict:
-    user = auth_repo.authenticate(payload.username, payload.password)
+def login(
+    payload: LoginRequest,
+    auth: AuthRepository = Depends(get_auth_repo),
+) -> dict:
+    user = auth.authenticate(payload.username, payload.password)
     if user is None:
         raise HTTPException(status_code=401, detail="Username/password salah")
 
-    token = create_access_token(user_id=user["id"], role=user["role"])
-    refresh_token = create_refresh_token(user_id=user["id"], role=user["role"])
+    token, refresh_token = create_token_pair(user_id=user["id"], role=user["role"])
     return {
         "user": user,
         "access_token": token,
@@ -172,18 +265,22 @@ def login(payload: LoginRequest) -> dict:
 
 
 @app.post("/auth/refresh")
-def refresh(payload: RefreshRequest) -> dict:
-    decoded = _decode_and_validate_token(payload.refresh_token, "refresh")
-    user = auth_repo.get_user_by_id(int(decoded["sub"]))
+def refresh(
+    payload: RefreshRequest,
+    auth: AuthRepository = Depends(get_auth_repo),
+) -> dict:
+    decoded = _decode_and_validate_token(payload.refresh_token, "refresh", auth)
+    user = auth.get_user_by_id(int(decoded["sub"]))
     if user is None:
         raise HTTPException(status_code=401, detail="User tidak ditemukan")
 
     old_jti = decoded.get("jti")
     if old_jti:
-        auth_repo.revoke_token(old_jti)
+        auth.revoke_token(old_jti, expires_at=decoded.get("exp"))
 
-    new_access_token = create_access_token(user_id=user["id"], role=user["role"])
-    new_refresh_token = create_refresh_token(user_id=user["id"], role=user["role"])
+    new_access_token, new_refresh_token = create_token_pair(
+        user_id=user["id"], role=user["role"]
+    )
     return {
         "access_token": new_access_token,
         "refresh_token": new_refresh_token,
@@ -195,16 +292,19 @@ def refresh(payload: RefreshRequest) -> dict:
 def logout(
     payload: LogoutRequest,
     access_payload: dict = Depends(get_access_payload),
+    auth: AuthRepository = Depends(get_auth_repo),
 ) -> dict:
     access_jti = access_payload.get("jti")
     if access_jti:
-        auth_repo.revoke_token(access_jti)
+        auth.revoke_token(access_jti, expires_at=access_payload.get("exp"))
 
     if payload.refresh_token:
-        decoded_refresh = _decode_and_validate_token(payload.refresh_token, "refresh")
+        decoded_refresh = _decode_and_validate_token(
+            payload.refresh_token, "refresh", auth
+        )
         refresh_jti = decoded_refresh.get("jti")
         if refresh_jti:
-            auth_repo.revoke_token(refresh_jti)
+            auth.revoke_token(refresh_jti, expires_at=decoded_refresh.get("exp"))
 
     return {"message": "logout berhasil"}
 
@@ -214,9 +314,10 @@ def update_user_role(
     user_id: int,
     payload: UpdateRoleRequest,
     _: User = Depends(require_admin),
+    auth: AuthRepository = Depends(get_auth_repo),
 ) -> dict:
     try:
-        updated = auth_repo.update_role(user_id=user_id, role=payload.role)
+        updated = auth.update_role(user_id=user_id, role=payload.role)
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc))
 
@@ -230,14 +331,14 @@ def list_users(
     limit: int = 50,
     offset: int = 0,
     _: User = Depends(require_admin),
+    auth: AuthRepository = Depends(get_auth_repo),
 ) -> dict:
     if limit < 1:
         raise HTTPException(status_code=400, detail="limit must be >= 1")
     if offset < 0:
         raise HTTPException(status_code=400, detail="offset must be >= 0")
 
-    users = auth_repo.list_users(limit=limit, offset=offset)
-    total = auth_repo.count_users()
+    users, total = auth.list_users_with_total(limit=limit, offset=offset)
     return {
         "rows": users,
         "count": len(users),
@@ -254,11 +355,16 @@ async def predict_image(
     min_conf: float = 0.0,
     language: str = "id",
     current_user: User = Depends(get_current_user),
+    history_repo: HistoryRepository = Depends(get_history_repo),
 ) -> dict:
+    timestamp = datetime.now().isoformat(timespec="seconds")
     try:
-        content = await file.read()
-        image = Image.open(BytesIO(content)).convert("RGB")
-        predictions, filtered, insight = analyze_image(image, top_k=top_k, min_conf=min_conf)
+        validate_analysis_params(top_k, min_conf)
+        tensor = await run_blocking(_decode_and_preprocess, file.file)
+        probs = await batcher.submit(tensor)
+        predictions, filtered, insight = summarize_predictions(
+            top_predictions(probs, top_k=top_k), min_conf=min_conf
+        )
     except (UnidentifiedImageError, OSError):
         raise HTTPException(status_code=400, detail="File bukan gambar valid.")
     except ValueError as exc:
@@ -266,24 +372,19 @@ async def predict_image(
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Internal error: {exc}")
 
-    visible = filtered if filtered else predictions
-    result = _to_response_rows(visible, language)
+    rounded = _round_predictions(predictions)
+    result = _visible_rows(rounded, filtered, language)
 
     if predictions:
         top = predictions[0]
-        repo.add(
-            timestamp=datetime.now().isoformat(timespec="seconds"),
+        await run_blocking(
+            history_repo.add,
+            timestamp=timestamp,
             filename=file.filename or "unknown",
             top_label=top.label,
             top_confidence=top.confidence,
             source="api",
-            top_predictions=[
-                {
-                    "label": item.label,
-                    "confidence": round(item.confidence, 2),
-                }
-                for item in predictions
-            ],
+            top_predictions=_history_predictions(rounded),
             user_id=current_user["id"],
         )
 
@@ -304,11 +405,15 @@ async def predict_video(
     sample_every_n_frames: int = 15,
     max_sampled_frames: int = 12,
     current_user: User = Depends(get_current_user),
+    history_repo: HistoryRepository = Depends(get_history_repo),
 ) -> dict:
+    timestamp = datetime.now().isoformat(timespec="seconds")
     try:
-        content = await file.read()
-        analyzed = analyze_video_bytes(
-            content,
+        suffix = os.path.splitext(file.filename or "")[1].lower() or ".mp4"
+        analyzed = await run_blocking(
+            analyze_video_stream,
+            file.file,
+            suffix=suffix,
             top_k=top_k,
             min_conf=min_conf,
             sample_every_n_frames=sample_every_n_frames,
@@ -321,21 +426,19 @@ async def predict_video(
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Internal error: {exc}")
 
-    visible = analyzed.filtered if analyzed.filtered else analyzed.predictions
-    result = _to_response_rows(visible, language)
+    rounded = _round_predictions(analyzed.predictions)
+    result = _visible_rows(rounded, analyzed.filtered, language)
 
     if analyzed.predictions:
         top = analyzed.predictions[0]
-        repo.add(
-            timestamp=datetime.now().isoformat(timespec="seconds"),
+        await run_blocking(
+            history_repo.add,
+            timestamp=timestamp,
             filename=file.filename or "unknown-video",
             top_label=top.label,
             top_confidence=top.confidence,
             source="api_video",
-            top_predictions=[
-                {"label": item.label, "confidence": round(item.confidence, 2)}
-                for item in analyzed.predictions
-            ],
+            top_predictions=_history_predictions(rounded),
             user_id=current_user["id"],
         )
 
@@ -358,7 +461,9 @@ def predict_from_url(
     sample_every_n_frames: int = 15,
     max_sampled_frames: int = 12,
     current_user: User = Depends(get_current_user),
+    history_repo: HistoryRepository = Depends(get_history_repo),
 ) -> dict:
+    timestamp = datetime.now().isoformat(timespec="seconds")
     try:
         analyzed = analyze_url(
             url=payload.url,
@@ -376,22 +481,19 @@ def predict_from_url(
         raise HTTPException(status_code=500, detail=f"Internal error: {exc}")
 
     predictions = analyzed.predictions
-    visible = analyzed.filtered_predictions if analyzed.filtered_predictions else analyzed.predictions
-    result = _to_response_rows(visible, language)
+    rounded = _round_predictions(predictions)
+    result = _visible_rows(rounded, analyzed.filtered_predictions, language)
 
     if predictions:
         top = predictions[0]
         save_source = f"api_url_{analyzed.content_kind}"
-        repo.add(
-            timestamp=datetime.now().isoformat(timespec="seconds"),
+        history_repo.add(
+            timestamp=timestamp,
             filename=analyzed.final_url,
             top_label=top.label,
             top_confidence=top.confidence,
             source=save_source,
-            top_predictions=[
-                {"label": item.label, "confidence": round(item.confidence, 2)}
-                for item in predictions
-            ],
+            top_predictions=_history_predictions(rounded),
             user_id=current_user["id"],
         )
 
@@ -416,73 +518,75 @@ async def predict_batch(
     min_conf: float = 0.0,
     language: str = "id",
     current_user: User = Depends(get_current_user),
+    history_repo: HistoryRepository = Depends(get_history_repo),
 ) -> dict:
-    outputs = []
-    for file in files:
+    timestamp = datetime.now().isoformat(timespec="seconds")
+    decoded = await asyncio.gather(
+        *(run_blocking(decode_image, file.file) for file in files),
+        return_exceptions=True,
+    )
+
+    # Semua gambar valid dianalisis dalam satu forward pass.
+    images = [item for item in decoded if not isinstance(item, BaseException)]
+    analysis_error: Exception | None = None
+    analyzed: list = []
+    if images:
         try:
-            content = await file.read()
-            image = Image.open(BytesIO(content)).convert("RGB")
-            predictions, filtered, insight = analyze_image(
-                image, top_k=top_k, min_conf=min_conf
-            )
-            visible = filtered if filtered else predictions
-
-            rows = _to_response_rows(visible, language)
-
-            if predictions:
-                top = predictions[0]
-                repo.add(
-                    timestamp=datetime.now().isoformat(timespec="seconds"),
-                    filename=file.filename or "unknown",
-                    top_label=top.label,
-                    top_confidence=top.confidence,
-                    source="api",
-                    top_predictions=[
-                        {
-                            "label": item.label,
-                            "confidence": round(item.confidence, 2),
-                        }
-                        for item in predictions
-                    ],
-                    user_id=current_user["id"],
-                )
+            analyzed = await run_blocking(analyze_images, images, top_k, min_conf)
+        except Exception as exc:
+            analysis_error = exc
+    analyzed_iter = iter(analyzed)
 
-            outputs.append(
-                {
-                    "filename": file.filename,
-                    "insight": insight,
-                    "predictions": rows,
-                    "error": None,
-                }
-            )
-        except (UnidentifiedImageError, OSError):
-            outputs.append(
-                {
-                    "filename": file.filename,
-                    "insight": None,
-                    "predictions": [],
-                    "error": "File bukan gambar valid.",
-                }
-            )
-        except ValueError as exc:
+    outputs = []
+    pending_history = []
+    for file, item in zip(files, decoded):
+        error = None
+        if isinstance(item, (UnidentifiedImageError, OSError)):
+            error = "File bukan gambar valid."
+        elif isinstance(item, BaseException):
+            error = str(item)
+        elif analysis_error is not None:
+            error = str(analysis_error)
+
+        if error is not None:
             outputs.append(
                 {
                     "filename": file.filename,
                     "insight": None,
                     "predictions": [],
-                    "error": str(exc),
+                    "error": error,
                 }
             )
-        except Exception as exc:
-            outputs.append(
+            continue
+
+        predictions, filtered, insight = next(analyzed_iter)
+        rounded = _round_predictions(predictions)
+        rows = _visible_rows(rounded, filtered, language)
+
+        if predictions:
+            top = predictions[0]
+            pending_history.append(
                 {
-                    "filename": file.filename,
-                    "insight": None,
-                    "predictions": [],
-                    "error": str(exc),
+                    "timestamp": timestamp,
+                    "filename": file.filename or "unknown",
+                    "top_label": top.label,
+                    "top_confidence": top.confidence,
+                    "source": "api",
+                    "top_predictions": _history_predictions(rounded),
+                    "user_id": current_user["id"],
                 }
             )
 
+        outputs.append(
+            {
+                "filename": file.filename,
+                "insight": insight,
+                "predictions": rows,
+                "error": None,
+            }
+        )
+
+    await run_blocking(history_repo.add_many, pending_history)
     return {"results": outputs, "count": len(outputs)}
 
 
@@ -496,30 +600,32 @@ def history(
     date_to: str | None = None,
     include_predictions: bool = False,
     user_id: int | None = None,
+    before_id: int | None = None,
     current_user: User = Depends(get_current_user),
+    history_repo: HistoryRepository = Depends(get_history_repo),
 ) -> dict:
     if limit < 1:
         raise HTTPException(status_code=400, detail="limit must be >= 1")
     if offset < 0:
         raise HTTPException(status_code=400, detail="offset must be >= 0")
-    if date_from:
-        parse_iso8601(date_from, "date_from")
-    if date_to:
-        parse_iso8601(date_to, "date_to")
-    if date_from and date_to:
-        parsed_from = parse_iso8601(date_from, "date_from")
-        parsed_to = parse_iso8601(date_to, "date_to")
-        if parsed_from > parsed_to:
-            raise HTTPException(
-                status_code=400,
-                detail="date_from tidak boleh lebih besar dari date_to",
-            )
+    if before_id is not None and offset:
+        raise HTTPException(
+            status_code=400,
+            detail="before_id tidak bisa digabung dengan offset",
+        )
+    parsed_from = parse_iso8601(date_from, "date_from") if date_from else None
+    parsed_to = parse_iso8601(date_to, "date_to") if date_to else None
+    if parsed_from and parsed_to and parsed_from > parsed_to:
+        raise HTTPException(
+            status_code=400,
+            detail="date_from tidak boleh lebih besar dari date_to",
+        )
 
     scoped_user_id = user_id
     if current_user["role"] != "admin":
         scoped_user_id = current_user["id"]
 
-    rows = repo.list_recent(
+    rows, total = history_repo.list_recent_with_total(
         limit=limit,
         offset=offset,
         source=source,
@@ -528,13 +634,7 @@ def history(
         date_to=date_to,
         include_predictions=include_predictions,
         user_id=scoped_user_id,
-    )
-    total = repo.count(
-        source=source,
-        label=label,
-        date_from=date_from,
-        date_to=date_to,
-        user_id=scoped_user_id,
+        before_id=before_id,
     )
     return {
         "rows": rows,
@@ -542,4 +642,6 @@ def history(
         "total": total,
         "limit": limit,
         "offset": offset,
+        # Kursor halaman berikutnya untuk keyset pagination (?before_id=...).
+        "next_before_id": rows[-1]["id"] if len(rows) == limit else None,
     }
@@ -1,30 +1,62 @@
 import csv
+import hashlib
 from datetime import datetime
 from io import StringIO
 
 import streamlit as st
-from PIL import Image, UnidentifiedImageError
+from PIL import UnidentifiedImageError
 
-from src.classifier import analyze_image
+from src.cache import TTLCache
+from src.classifier import (
+    decode_image,
+    load_model,
+    predict_batch,
+    summarize_predictions,
+)
 from src.history import HistoryRepository
 from src.media import analyze_video_bytes
 from src.translation import translate_label
 from src.url_analyzer import analyze_url
 
+MAX_TOP_K = 10
+
 st.set_page_config(
     page_title="Multimedia Recognition App",
     page_icon=":frame_with_picture:",
     layout="centered",
 )
 
-repo = HistoryRepository("history.db")
+
+@st.cache_resource
+def get_repo() -> HistoryRepository:
+    return HistoryRepository("history.db")
+
+
+@st.cache_resource(show_spinner="Memuat model...")
+def get_model():
+    return load_model()
+
+
+@st.cache_resource
+def get_analysis_cache() -> TTLCache:
+    # Prediksi top-MAX_TOP_K per hash isi gambar, dibagi antar sesi. top_k dan
+    # min_conf diterapkan setelahnya, jadi menggeser slider tidak memicu
+    # forward pass ulang.
+    return TTLCache(maxsize=256, ttl=3600.0)
+
+
+repo = get_repo()
+get_model()
+analysis_cache = get_analysis_cache()
 
 st.title("Multimedia Recognition App")
 st.caption("Analisis objek dari gambar, video, atau URL media.")
 
 with st.sidebar:
     st.header("Pengaturan Analisis")
-    top_k = st.slider("Jumlah Top Prediksi", min_value=3, max_value=10, value=5)
+    top_k = st.slider(
+        "Jumlah Top Prediksi", min_value=3, max_value=MAX_TOP_K, value=5
+    )
     min_conf = st.slider(
         "Filter Confidence Minimum (%)", min_value=0, max_value=100, value=0
     )
@@ -39,29 +71,63 @@ with st.sidebar:
         st.success("Riwayat database dibersihkan.")
 
 def render_predictions(predictions):
-    for item in predictions:
-        label = translate_label(item.label, language=language)
-        st.write(f"**{label}**")
-        st.progress(int(item.confidence), text=f"{item.confidence:.2f}%")
+    # Satu tabel per hasil, bukan st.write + st.progress per prediksi.
+    st.dataframe(
+        [
+            {
+                "label": translate_label(item.label, language=language),
+                "confidence": item.confidence,
+            }
+            for item in predictions
+        ],
+        column_config={
+            "label": st.column_config.TextColumn("Label"),
+            "confidence": st.column_config.ProgressColumn(
+                "Confidence", min_value=0, max_value=100, format="%.2f%%"
+            ),
+        },
+        hide_index=True,
+        use_container_width=True,
+    )
 
 
-def save_history_row(name: str, source: str, predictions):
+def queue_history_row(pending: list, name: str, source: str, predictions):
     if not (save_history and predictions):
         return
     top = predictions[0]
-    repo.add(
-        timestamp=datetime.now().isoformat(timespec="seconds"),
-        filename=name,
-        top_label=top.label,
-        top_confidence=top.confidence,
-        source=source,
-        top_predictions=[
-            {"label": item.label, "confidence": round(item.confidence, 2)}
-            for item in predictions
-        ],
+    pending.append(
+        {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "filename": name,
+            "top_label": top.label,
+            "top_confidence": top.confidence,
+            "source": source,
+            "top_predictions": [
+                {"label": item.label, "confidence": round(item.confidence, 2)}
+                for item in predictions
+            ],
+        }
     )
 
 
+def save_history_rows(pending: list):
+    # Satu transaksi untuk semua hasil dalam satu aksi upload.
+    if pending:
+        repo.add_many(pending)
+
+
+def history_csv(rows) -> str:
+    csv_buffer = StringIO()
+    writer = csv.DictWriter(
+        csv_buffer,
+        fieldnames=["timestamp", "filename", "top_label", "top_confidence", "source"],
+        extrasaction="ignore",
+    )
+    writer.writeheader()
+    writer.writerows(rows)
+    return csv_buffer.getvalue()
+
+
 image_tab, video_tab, url_tab = st.tabs(["Image", "Video", "URL"])
 
 with image_tab:
@@ -73,31 +139,62 @@ with image_tab:
     )
     if uploaded_images:
         st.subheader("Hasil Analisis Gambar")
-        for uploaded_file in uploaded_images:
-            st.markdown(f"### {uploaded_file.name}")
+        raws = [uploaded_file.getvalue() for uploaded_file in uploaded_images]
+        keys = [hashlib.blake2b(raw, digest_size=16).hexdigest() for raw in raws]
+        top_lists = {}
+        invalid = set()
+        to_analyze = []
+        for index, (raw, key) in enumerate(zip(raws, keys)):
+            cached = analysis_cache.get(key)
+            if cached is not None:
+                top_lists[index] = cached
+                continue
             try:
-                image = Image.open(uploaded_file).convert("RGB")
-                st.image(
-                    image,
-                    caption=f"Input: {uploaded_file.name}",
-                    use_container_width=True,
-                )
-                with st.spinner(f"Menganalisis {uploaded_file.name}..."):
-                    predictions, filtered, insight = analyze_image(
-                        image=image,
-                        top_k=top_k,
-                        min_conf=float(min_conf),
-                    )
-                st.info(insight)
-                render_predictions(filtered if filtered else predictions)
-                save_history_row(uploaded_file.name, "streamlit_image", predictions)
+                to_analyze.append((index, decode_image(raw)))
             except (UnidentifiedImageError, OSError):
-                st.error(f"File {uploaded_file.name} bukan gambar valid.")
+                invalid.add(index)
+
+        # Gambar yang belum pernah dianalisis diproses dalam satu forward pass.
+        if to_analyze:
+            try:
+                with st.spinner(f"Menganalisis {len(to_analyze)} gambar..."):
+                    analyzed = predict_batch(
+                        [image for _, image in to_analyze], top_k=MAX_TOP_K
+                    )
+                for (index, _), predictions in zip(to_analyze, analyzed):
+                    top_lists[index] = predictions
+                    analysis_cache.set(keys[index], predictions)
             except ValueError as exc:
-                st.error(f"Input tidak valid untuk {uploaded_file.name}: {exc}")
+                st.error(f"Input tidak valid: {exc}")
             except Exception as exc:
-                st.error(f"Terjadi error saat analisis {uploaded_file.name}: {exc}")
+                st.error(f"Terjadi error saat analisis gambar: {exc}")
+
+        pending_history = []
+        for index, (uploaded_file, raw) in enumerate(zip(uploaded_images, raws)):
+            st.markdown(f"### {uploaded_file.name}")
+            if index in invalid:
+                st.error(f"File {uploaded_file.name} bukan gambar valid.")
+                st.divider()
+                continue
+
+            # Byte asli dikirim langsung ke browser, tanpa re-encode PNG.
+            st.image(
+                raw,
+                caption=f"Input: {uploaded_file.name}",
+                use_container_width=True,
+            )
+            top_list = top_lists.get(index)
+            if top_list is not None:
+                predictions, filtered, insight = summarize_predictions(
+                    top_list[:top_k], min_conf=float(min_conf)
+                )
+                st.info(insight)
+                render_predictions(filtered if filtered else predictions)
+                queue_history_row(
+                    pending_history, uploaded_file.name, "streamlit_image", predictions
+                )
             st.divider()
+        save_history_rows(pending_history)
     else:
         st.info("Upload minimal satu gambar untuk mulai klasifikasi.")
 
@@ -110,6 +207,7 @@ with video_tab:
     )
     if uploaded_videos:
         st.subheader("Hasil Analisis Video")
+        pending_history = []
         for uploaded_file in uploaded_videos:
             st.markdown(f"### {uploaded_file.name}")
             try:
@@ -129,7 +227,12 @@ with video_tab:
                 )
                 visible = analyzed.filtered if analyzed.filtered else analyzed.predictions
                 render_predictions(visible)
-                save_history_row(uploaded_file.name, "streamlit_video", analyzed.predictions)
+                queue_history_row(
+                    pending_history,
+                    uploaded_file.name,
+                    "streamlit_video",
+                    analyzed.predictions,
+                )
             except ValueError as exc:
                 st.error(f"Input video tidak valid untuk {uploaded_file.name}: {exc}")
             except RuntimeError as exc:
@@ -137,6 +240,7 @@ with video_tab:
             except Exception as exc:
                 st.error(f"Terjadi error saat analisis {uploaded_file.name}: {exc}")
             st.divider()
+        save_history_rows(pending_history)
     else:
         st.info("Upload minimal satu video untuk mulai analisis.")
 
@@ -175,11 +279,14 @@ with url_tab:
                             st.caption(
                                 f"Frame dianalisis: {analyzed.sampled_frames} dari total {analyzed.total_frames}"
                             )
-                        save_history_row(
+                        pending_history = []
+                        queue_history_row(
+                            pending_history,
                             analyzed.final_url,
                             f"streamlit_url_{analyzed.content_kind}",
                             analyzed.predictions,
                         )
+                        save_history_rows(pending_history)
                     else:
                         doc = analyzed.document or {}
                         if doc.get("title"):
@@ -204,17 +311,11 @@ if history_rows:
     st.subheader("Riwayat Prediksi (Database)")
     st.dataframe(history_rows, use_container_width=True)
 
-    csv_buffer = StringIO()
-    writer = csv.DictWriter(
-        csv_buffer,
-        fieldnames=["timestamp", "filename", "top_label", "top_confidence", "source"],
-    )
-    writer.writeheader()
-    writer.writerows(history_rows)
-
-    st.download_button(
-        label="Download Riwayat (CSV)",
-        data=csv_buffer.getvalue(),
-        file_name="prediction_history.csv",
-        mime="text/csv",
-    )
+    # CSV hanya dibangun saat diminta, bukan di setiap rerun.
+    if st.button("Siapkan CSV Riwayat"):
+        st.download_button(
+            label="Download Riwayat (CSV)",
+            data=history_csv(history_rows),
+            file_name="prediction_history.csv",
+            mime="text/csv",
+        )
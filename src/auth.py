@@ -3,13 +3,31 @@ import hmac
 import os
 import secrets
 import sqlite3
+import time
 import uuid
 from datetime import UTC, datetime, timedelta
-from pathlib import Path
 from typing import Optional, TypedDict
 
 import jwt
-
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+
+from src.cache import TTLCache
+from src.db import ConnectionPool
+
+AUTH_CACHE_TTL_SECONDS = 30.0
+JWT_ALGORITHM = "HS256"
+# Dibaca sekali saat import; ubah APP_SECRET_KEY lalu restart proses.
+_SECRET_KEY = os.getenv("APP_SECRET_KEY", "dev-secret-change-this")
+_JWT_ALGORITHMS = [JWT_ALGORITHM]
+# Payload JWT yang sudah diverifikasi, per proses; revokasi tetap dicek
+# terpisah lewat is_token_revoked (ke DB bila belum tercatat di proses ini)
+# sehingga logout di worker mana pun langsung berlaku.
+_DECODE_CACHE = TTLCache(maxsize=4096, ttl=AUTH_CACHE_TTL_SECONDS)
+LEGACY_PBKDF2_ITERATIONS = 100_000
+_PBKDF2_DIGEST_SIZE = hashlib.sha256().digest_size
+
+_PASSWORD_HASHER = PasswordHasher(time_cost=2, memory_cost=65536, parallelism=1)
 
 class User(TypedDict):
     id: int
@@ -20,14 +38,19 @@ class User(TypedDict):
 
 class AuthRepository:
     def __init__(self, db_path: str = "history.db") -> None:
-        self.db_path = Path(db_path)
+        self._pool = ConnectionPool(db_path)
+        self.db_path = self._pool.db_path
+        # Hanya jawaban positif yang di-cache: revokasi bersifat permanen,
+        # sedangkan "belum dicabut" harus dicek ke DB agar revoke dari worker
+        # lain langsung berlaku.
+        self._revoked_cache = TTLCache(maxsize=4096, ttl=AUTH_CACHE_TTL_SECONDS)
         self._init_db()
 
-    def _connect(self) -> sqlite3.Connection:
-        return sqlite3.connect(self.db_path)
+    def close(self) -> None:
+        self._pool.close()
 
     def _init_db(self) -> None:
-        with self._connect() as conn:
+        with self._pool.writer() as conn:
             conn.execute(
                 """
                 CREATE TABLE IF NOT EXISTS users (
@@ -43,11 +66,30 @@ class AuthRepository:
                 """
                 CREATE TABLE IF NOT EXISTS revoked_tokens (
                     jti TEXT PRIMARY KEY,
-                    revoked_at TEXT NOT NULL
+                    revoked_at TEXT NOT NULL,
+                    expires_at INTEGER
                 )
                 """
             )
-            conn.commit()
+            columns = {
+                row[1]
+                for row in conn.execute("PRAGMA table_info(revoked_tokens)").fetchall()
+            }
+            if "expires_at" not in columns:
+                conn.execute("ALTER TABLE revoked_tokens ADD COLUMN expires_at INTEGER")
+            conn.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expires_at
+                ON revoked_tokens(expires_at)
+                """
+            )
+            # Index covering untuk list_users (tanpa kolom password_hash).
+            conn.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_users_listing
+                ON users(id, username, role, created_at)
+                """
+            )
 
     def create_user(self, username: str, password: str, role: str = "user") -> User:
         normalized_username = username.strip().lower()
@@ -62,7 +104,7 @@ class AuthRepository:
         created_at = datetime.now(UTC).isoformat(timespec="seconds")
 
         try:
-            with self._connect() as conn:
+            with self._pool.writer() as conn:
                 cursor = conn.execute(
                     """
                     INSERT INTO users (username, password_hash, role, created_at)
@@ -70,7 +112,6 @@ class AuthRepository:
                     """,
                     (normalized_username, password_hash, role, created_at),
                 )
-                conn.commit()
                 user_id = int(cursor.lastrowid)
         except sqlite3.IntegrityError as exc:
             raise ValueError("username sudah terdaftar") from exc
@@ -84,7 +125,7 @@ class AuthRepository:
 
     def authenticate(self, username: str, password: str) -> Optional[User]:
         normalized_username = username.strip().lower()
-        with self._connect() as conn:
+        with self._pool.reader() as conn:
             row = conn.execute(
                 """
                 SELECT id, username, password_hash, role, created_at
@@ -98,6 +139,13 @@ class AuthRepository:
             return None
         if not verify_password(password, row[2]):
             return None
+        if password_needs_rehash(row[2]):
+            # Hash lama (PBKDF2) di-upgrade ke Argon2id saat login berhasil.
+            with self._pool.writer() as conn:
+                conn.execute(
+                    "UPDATE users SET password_hash = ? WHERE id = ?",
+                    (hash_password(password), int(row[0])),
+                )
 
         return {
             "id": int(row[0]),
@@ -107,7 +155,9 @@ class AuthRepository:
         }
 
     def get_user_by_id(self, user_id: int) -> Optional[User]:
-        with self._connect() as conn:
+        # Tidak di-cache: role dipakai untuk otorisasi, jadi perubahan dari
+        # worker lain harus langsung terlihat (lookup PRIMARY KEY murah).
+        with self._pool.reader() as conn:
             row = conn.execute(
                 """
                 SELECT id, username, role, created_at
@@ -130,7 +180,7 @@ class AuthRepository:
         if role not in {"user", "admin"}:
             raise ValueError("role tidak valid")
 
-        with self._connect() as conn:
+        with self._pool.writer() as conn:
             cursor = conn.execute(
                 """
                 UPDATE users
@@ -139,17 +189,23 @@ class AuthRepository:
                 """,
                 (role, user_id),
             )
-            conn.commit()
             if cursor.rowcount == 0:
                 return None
 
         return self.get_user_by_id(user_id)
 
     def list_users(self, limit: int = 50, offset: int = 0) -> list[User]:
-        with self._connect() as conn:
+        users, _ = self.list_users_with_total(limit=limit, offset=offset)
+        return users
+
+    def list_users_with_total(
+        self, limit: int = 50, offset: int = 0
+    ) -> tuple[list[User], int]:
+        """Return one page of users plus the total user count in one query."""
+        with self._pool.reader() as conn:
             rows = conn.execute(
                 """
-                SELECT id, username, role, created_at
+                SELECT id, username, role, created_at, COUNT(*) OVER () AS total
                 FROM users
                 ORDER BY id ASC
                 LIMIT ? OFFSET ?
@@ -157,7 +213,7 @@ class AuthRepository:
                 (limit, offset),
             ).fetchall()
 
-        return [
+        users: list[User] = [
             {
                 "id": int(row[0]),
                 "username": row[1],
@@ -166,61 +222,101 @@ class AuthRepository:
             }
             for row in rows
         ]
+        if rows:
+            total = int(rows[0][4])
+        else:
+            # Halaman kosong tidak membawa nilai window COUNT(*) OVER ().
+            total = 0 if offset == 0 else self.count_users()
+        return users, total
 
     def count_users(self) -> int:
-        with self._connect() as conn:
+        with self._pool.reader() as conn:
             row = conn.execute("SELECT COUNT(*) FROM users").fetchone()
         return int(row[0]) if row else 0
 
-    def revoke_token(self, jti: str) -> None:
-        with self._connect() as conn:
+    def revoke_token(self, jti: str, expires_at: Optional[int] = None) -> None:
+        now = datetime.now(UTC)
+        with self._pool.writer() as conn:
             conn.execute(
                 """
-                INSERT OR IGNORE INTO revoked_tokens (jti, revoked_at)
-                VALUES (?, ?)
+                INSERT OR IGNORE INTO revoked_tokens (jti, revoked_at, expires_at)
+                VALUES (?, ?, ?)
                 """,
-                (jti, datetime.now(UTC).isoformat(timespec="seconds")),
+                (jti, now.isoformat(timespec="seconds"), expires_at),
             )
-            conn.commit()
+            # Token yang sudah lewat exp ditolak saat decode, jadi catatan
+            # revokasinya tidak perlu disimpan/dimuat lagi.
+            conn.execute(
+                "DELETE FROM revoked_tokens WHERE expires_at <= ?",
+                (int(now.timestamp()),),
+            )
+        self._revoked_cache.set(jti, True)
 
     def is_token_revoked(self, jti: str) -> bool:
-        with self._connect() as conn:
+        if self._revoked_cache.get(jti):
+            return True
+        with self._pool.reader() as conn:
+            # jti adalah PRIMARY KEY: satu seek B-tree per request.
             row = conn.execute(
-                "SELECT 1 FROM revoked_tokens WHERE jti = ? LIMIT 1",
-                (jti,),
+                "SELECT 1 FROM revoked_tokens WHERE jti = ?", (jti,)
             ).fetchone()
-        return row is not None
+        if row is None:
+            return False
+        self._revoked_cache.set(jti, True)
+        return True
 
 
 def hash_password(password: str) -> str:
-    salt = secrets.token_bytes(16)
+    return _PASSWORD_HASHER.hash(password)
+
+
+def _hash_password_pbkdf2(password: str, salt: Optional[bytes] = None) -> str:
+    salt = salt if salt is not None else secrets.token_bytes(16)
     digest = hashlib.pbkdf2_hmac(
         "sha256",
         password.encode("utf-8"),
         salt,
-        100_000,
+        LEGACY_PBKDF2_ITERATIONS,
     )
     return f"{salt.hex()}${digest.hex()}"
 
 
+def _is_argon2_hash(encoded_hash: str) -> bool:
+    return encoded_hash.startswith("$argon2")
+
+
 def verify_password(password: str, encoded_hash: str) -> bool:
+    if _is_argon2_hash(encoded_hash):
+        try:
+            return _PASSWORD_HASHER.verify(encoded_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+
     try:
         salt_hex, digest_hex = encoded_hash.split("$", maxsplit=1)
+        salt = bytes.fromhex(salt_hex)
+        expected = bytes.fromhex(digest_hex)
     except ValueError:
         return False
-    salt = bytes.fromhex(salt_hex)
-    expected = bytes.fromhex(digest_hex)
+    if not salt or len(expected) != _PBKDF2_DIGEST_SIZE:
+        # Hash rusak ditolak tanpa menjalankan 100k iterasi PBKDF2.
+        return False
     candidate = hashlib.pbkdf2_hmac(
         "sha256",
         password.encode("utf-8"),
         salt,
-        100_000,
+        LEGACY_PBKDF2_ITERATIONS,
     )
     return hmac.compare_digest(candidate, expected)
 
 
-def _secret_key() -> str:
-    return os.getenv("APP_SECRET_KEY", "dev-secret-change-this")
+def password_needs_rehash(encoded_hash: str) -> bool:
+    if not _is_argon2_hash(encoded_hash):
+        return True
+    try:
+        return _PASSWORD_HASHER.check_needs_rehash(encoded_hash)
+    except InvalidHashError:
+        return True
 
 
 def _create_token(
@@ -229,8 +325,9 @@ def _create_token(
     role: str,
     token_type: str,
     expires_minutes: int,
+    now: Optional[datetime] = None,
 ) -> str:
-    now = datetime.now(UTC)
+    now = now or datetime.now(UTC)
     payload = {
         "sub": str(user_id),
         "role": role,
@@ -239,7 +336,7 @@ def _create_token(
         "iat": int(now.timestamp()),
         "exp": int((now + timedelta(minutes=expires_minutes)).timestamp()),
     }
-    return jwt.encode(payload, _secret_key(), algorithm="HS256")
+    return jwt.encode(payload, _SECRET_KEY, algorithm=JWT_ALGORITHM)
 
 
 def create_access_token(user_id: int, role: str, expires_minutes: int = 60) -> str:
@@ -260,5 +357,46 @@ def create_refresh_token(user_id: int, role: str, expires_minutes: int = 60 * 24
     )
 
 
+def _decode_cached(token: str) -> dict:
+    # Kunci berupa digest 16 byte, bukan token utuh; entri kedaluwarsa
+    # setelah TTL sehingga cache tidak menahan token lama selamanya.
+    key = hashlib.sha256(token.encode()).digest()[:16]
+    payload = _DECODE_CACHE.get(key)
+    if payload is None:
+        payload = jwt.decode(token, _SECRET_KEY, algorithms=_JWT_ALGORITHMS)
+        _DECODE_CACHE.set(key, payload)
+    return payload
+
+
+def create_token_pair(
+    user_id: int,
+    role: str,
+    access_expires_minutes: int = 60,
+    refresh_expires_minutes: int = 60 * 24 * 7,
+) -> tuple[str, str]:
+    """Return (access_token, refresh_token) sharing one clock read."""
+    now = datetime.now(UTC)
+    access_token = _create_token(
+        user_id=user_id,
+        role=role,
+        token_type="access",
+        expires_minutes=access_expires_minutes,
+        now=now,
+    )
+    refresh_token = _create_token(
+        user_id=user_id,
+        role=role,
+        token_type="refresh",
+        expires_minutes=refresh_expires_minutes,
+        now=now,
+    )
+    return access_token, refresh_token
+
+
 def decode_access_token(token: str) -> dict:
-    return jwt.decode(token, _secret_key(), algorithms=["HS256"])
+    payload = _decode_cached(token)
+    # Hasil decode di-cache per token, jadi masa berlaku dicek ulang di sini.
+    exp = payload.get("exp")
+    if exp is not None and exp <= time.time():
+        raise jwt.ExpiredSignatureError("Signature has expired")
+    return dict(payload)
@@ -0,0 +1,173 @@
+import asyncio
+import time
+from concurrent.futures import Executor
+from typing import Callable, List, Optional, Tuple
+
+import torch
+
+from src.classifier import run_model
+
+DEFAULT_MAX_BATCH_SIZE = 16
+DEFAULT_BATCH_TIMEOUT_MS = 5.0
+DEFAULT_CONTROL_INTERVAL_S = 5.0
+# Perkiraan konservatif memori aktivasi ResNet50 per sampel saat inferensi.
+_GPU_BYTES_PER_SAMPLE = 64 * 1024 * 1024
+
+_PendingItem = Tuple[torch.Tensor, asyncio.Future]
+
+
+def probe_max_batch_size(limit: int = DEFAULT_MAX_BATCH_SIZE) -> int:
+    """Cap the batch size by free GPU memory; CPU keeps the configured limit."""
+    if limit < 1:
+        raise ValueError("limit harus >= 1")
+    if not torch.cuda.is_available():
+        return limit
+    try:
+        free_bytes, _ = torch.cuda.mem_get_info()
+    except RuntimeError:
+        return limit
+    return max(1, min(limit, free_bytes // _GPU_BYTES_PER_SAMPLE))
+
+
+class InferenceBatcher:
+    """Group concurrent single-image requests into one model forward pass."""
+
+    def __init__(
+        self,
+        runner: Callable[[torch.Tensor], torch.Tensor] = run_model,
+        *,
+        executor: Optional[Executor] = None,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait_ms: float = DEFAULT_BATCH_TIMEOUT_MS,
+        control_interval_s: float = DEFAULT_CONTROL_INTERVAL_S,
+    ) -> None:
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size harus >= 1")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms harus >= 0")
+        self._runner = runner
+        self._executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.control_interval_s = control_interval_s
+        # Jumlah minimum request yang ditunggu sebelum forward pass,
+        # dinaikkan/diturunkan otomatis berdasarkan kedalaman antrean.
+        self.min_batch = 1
+        self._arrivals = 0
+        self._completed = 0
+        self._window_started = time.monotonic()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._worker is not None and not self._worker.done():
+            return
+        # Queue dan worker terikat ke event loop yang sedang berjalan.
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._worker = loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        worker = self._worker
+        self._worker = None
+        if worker is None or worker.done():
+            return
+        worker.cancel()
+        try:
+            await worker
+        except asyncio.CancelledError:
+            pass
+
+    async def submit(self, tensor: torch.Tensor) -> torch.Tensor:
+        """Queue one CHW tensor and wait for its probability vector."""
+        self.start()
+        future = self._loop.create_future()
+        self._arrivals += 1
+        await self._queue.put((tensor, future))
+        return await future
+
+    def pending_requests(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def metrics(self) -> dict:
+        return {
+            "pending_requests": self.pending_requests(),
+            "current_min_batch": self.min_batch,
+            "max_batch_size": self.max_batch_size,
+        }
+
+    async def _collect(self) -> List[_PendingItem]:
+        queue = self._queue
+        while True:
+            if self.min_batch <= 1:
+                first = await queue.get()
+                break
+            # Saat antrean kosong, min_batch diturunkan setiap control interval
+            # agar batcher tidak tertahan di mode batching setelah lonjakan.
+            try:
+                first = await asyncio.wait_for(
+                    queue.get(), max(self.control_interval_s, 0.001)
+                )
+                break
+            except asyncio.TimeoutError:
+                self._adjust_min_batch()
+
+        batch = [first]
+        deadline = self._loop.time() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            if not queue.empty():
+                batch.append(queue.get_nowait())
+                continue
+            # min_batch 1 berarti beban rendah: jangan menambah latensi.
+            # Di atas itu tunggu sampai deadline untuk mengisi batch.
+            if self.min_batch <= 1:
+                break
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _adjust_min_batch(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._window_started
+        if elapsed < self.control_interval_s:
+            return
+
+        incoming_qps = self._arrivals / elapsed
+        throughput = self._completed / elapsed
+        if throughput < incoming_qps or self.pending_requests() > self.min_batch:
+            self.min_batch = min(self.min_batch + 1, self.max_batch_size)
+        elif self.pending_requests() == 0:
+            self.min_batch = max(self.min_batch - 1, 1)
+
+        self._arrivals = 0
+        self._completed = 0
+        self._window_started = now
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            try:
+                stacked = torch.stack([tensor for tensor, _ in batch])
+                probs = await self._loop.run_in_executor(
+                    self._executor, self._runner, stacked
+                )
+            except Exception as exc:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                self._completed += len(batch)
+                self._adjust_min_batch()
+                continue
+
+            for (_, future), row in zip(batch, probs):
+                if not future.done():
+                    future.set_result(row)
+            self._completed += len(batch)
+            self._adjust_min_batch()
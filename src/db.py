@@ -0,0 +1,128 @@
+import os
+import queue
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional, Set
+
+
+class ConnectionPool:
+    """SQLite pool with one shared writer and a bounded set of readers."""
+
+    def __init__(self, db_path: str | Path, readers: Optional[int] = None) -> None:
+        # URI "file:..." (mis. "file:test?mode=memory&cache=shared") disimpan
+        # apa adanya; Path() akan menormalkan "//" dan merusak URI-nya.
+        if str(db_path) == ":memory:":
+            # Tiap koneksi ke ":memory:" mendapat DB kosong sendiri; pool butuh
+            # satu DB bersama untuk writer dan semua reader.
+            db_path = f"file:pool-{uuid.uuid4().hex}?mode=memory&cache=shared"
+        self.uri = str(db_path).startswith("file:")
+        self.db_path: str | Path = str(db_path) if self.uri else Path(db_path)
+        self.max_readers = readers or os.cpu_count() or 1
+        self._writer: Optional[sqlite3.Connection] = None
+        self._writer_lock = threading.Lock()
+        self._idle_readers: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        # Semua koneksi yang dibuka (writer dan reader, termasuk yang sedang
+        # dipinjam) agar close() bisa menutup semuanya.
+        self._connections: Set[sqlite3.Connection] = set()
+        self._reader_count = 0
+        self._readers_lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        # Autocommit: transaksi tulis dibuka eksplisit di writer().
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=256,
+            uri=self.uri,
+        )
+        if not self.in_memory:
+            # WAL, sync NORMAL dan mmap hanya bermakna untuk file di disk.
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA mmap_size=268435456")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-20000")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    @property
+    def in_memory(self) -> bool:
+        path = str(self.db_path)
+        return self.uri and (
+            path.startswith("file::memory:") or "mode=memory" in path
+        )
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Serialize writes on one connection; commit on success, rollback on error."""
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self._open()
+                with self._readers_lock:
+                    self._connections.add(self._writer)
+            conn = self._writer
+            # IMMEDIATE mengambil write lock di awal sehingga busy_timeout
+            # berlaku, bukan gagal saat upgrade lock di tengah transaksi.
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                # COMMIT yang gagal (mis. SQLITE_BUSY, constraint deferred)
+                # meninggalkan transaksi terbuka; tutup agar BEGIN berikutnya
+                # tidak gagal.
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            self._release_reader(conn)
+
+    def _acquire_reader(self) -> sqlite3.Connection:
+        try:
+            return self._idle_readers.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._readers_lock:
+            if self._reader_count < self.max_readers:
+                conn = self._open()
+                self._connections.add(conn)
+                self._reader_count += 1
+                return conn
+        return self._idle_readers.get()
+
+    def _release_reader(self, conn: sqlite3.Connection) -> None:
+        with self._readers_lock:
+            # Koneksi yang sudah ditutup close() saat dipinjam tidak boleh
+            # kembali ke antrean idle.
+            if conn in self._connections:
+                self._idle_readers.put(conn)
+
+    def close(self) -> None:
+        # PRAGMA optimize memakai statistik query koneksi itu sendiri, jadi
+        # dijalankan di tiap koneksi tepat sebelum ditutup.
+        with self._writer_lock, self._readers_lock:
+            for conn in self._connections:
+                self._optimize_and_close(conn)
+            self._connections.clear()
+            self._writer = None
+            self._reader_count = 0
+            self._idle_readers = queue.Queue()
+
+    @staticmethod
+    def _optimize_and_close(conn: sqlite3.Connection) -> None:
+        try:
+            conn.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass
+        conn.close()
@@ -1,19 +1,88 @@
 import sqlite3
 import json
-from pathlib import Path
-from typing import Dict, List, Optional
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.db import ConnectionPool
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson ada di requirements.txt
+    orjson = None
+
+# SQL dibangun sekali per bentuk filter; string yang identik membuat cache
+# statement sqlite3 memakai ulang statement yang sudah di-prepare.
+_INSERT_SQL = """
+    INSERT INTO prediction_history
+    (user_id, timestamp, filename, top_label, top_label_key, top_confidence, source, top_predictions)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_FILTER_CONDITIONS = {
+    "source": "source = ?",
+    # Prefix case-insensitive sebagai rentang pada kolom ter-normalisasi,
+    # sehingga index bisa dipakai (LIKE '%...%' selalu full scan).
+    "label": "top_label_key >= ? AND top_label_key < ?",
+    "date_from": "timestamp >= ?",
+    "date_to": "timestamp <= ?",
+    "user_id": "user_id = ?",
+    "before_id": "id < ?",
+}
+
+
+def _dumps_predictions(predictions: List[Dict[str, float]]) -> str:
+    if orjson is not None:
+        return orjson.dumps(predictions).decode()
+    return json.dumps(predictions, ensure_ascii=True)
+
+
+def _loads_predictions(raw: str) -> List[Dict[str, float]]:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+@lru_cache(maxsize=64)
+def _where_clause(active_filters: Tuple[str, ...]) -> str:
+    if not active_filters:
+        return ""
+    return "WHERE " + " AND ".join(_FILTER_CONDITIONS[name] for name in active_filters)
+
+
+@lru_cache(maxsize=128)
+def _select_page_sql(
+    active_filters: Tuple[str, ...], include_predictions: bool, with_total: bool
+) -> str:
+    select_columns = "id, timestamp, filename, top_label, top_confidence, source"
+    if include_predictions:
+        select_columns += ", top_predictions"
+    if with_total:
+        select_columns += ", COUNT(*) OVER () AS total"
+    return f"""
+        SELECT {select_columns}
+        FROM prediction_history
+        {_where_clause(active_filters)}
+        ORDER BY id DESC
+        {"LIMIT ?" if "before_id" in active_filters else "LIMIT ? OFFSET ?"}
+    """
+
+
+@lru_cache(maxsize=64)
+def _count_sql(active_filters: Tuple[str, ...]) -> str:
+    return f"SELECT COUNT(*) FROM prediction_history {_where_clause(active_filters)}"
 
 
 class HistoryRepository:
     def __init__(self, db_path: str = "history.db") -> None:
-        self.db_path = Path(db_path)
+        self._pool = ConnectionPool(db_path)
+        self.db_path = self._pool.db_path
         self._init_db()
 
-    def _connect(self) -> sqlite3.Connection:
-        return sqlite3.connect(self.db_path)
+    def close(self) -> None:
+        self._pool.close()
 
     def _init_db(self) -> None:
-        with self._connect() as conn:
+        with self._pool.writer() as conn:
             conn.execute(
                 """
                 CREATE TABLE IF NOT EXISTS prediction_history (
@@ -30,7 +99,6 @@ class HistoryRepository:
             )
             self._ensure_columns(conn)
             self._ensure_indexes(conn)
-            conn.commit()
 
     def _ensure_columns(self, conn: sqlite3.Connection) -> None:
         columns = {
@@ -45,6 +113,10 @@ class HistoryRepository:
             conn.execute(
                 "ALTER TABLE prediction_history ADD COLUMN user_id INTEGER"
             )
+        if "top_label_key" not in columns:
+            conn.execute(
+                "ALTER TABLE prediction_history ADD COLUMN top_label_key TEXT"
+            )
 
     def _ensure_indexes(self, conn: sqlite3.Connection) -> None:
         conn.execute(
@@ -65,12 +137,44 @@ class HistoryRepository:
             ON prediction_history(top_label)
             """
         )
+        conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_prediction_history_top_label_key
+            ON prediction_history(top_label_key)
+            """
+        )
+        # Baris lama (atau yang disisipkan tanpa kolom ini) diisi ulang.
+        conn.execute(
+            """
+            UPDATE prediction_history SET top_label_key = lower(top_label)
+            WHERE top_label_key IS NULL
+            """
+        )
         conn.execute(
             """
             CREATE INDEX IF NOT EXISTS idx_prediction_history_user_id
             ON prediction_history(user_id)
             """
         )
+        # Halaman riwayat global cukup memindai rowid secara mundur; index
+        # covering global lama hanya menggandakan biaya tulis.
+        conn.execute("DROP INDEX IF EXISTS idx_prediction_history_recent")
+        # Index covering untuk list_recent per user: halaman riwayat dibaca
+        # dari daun index tanpa membuka baris tabel (yang memuat JSON
+        # top_predictions).
+        conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_prediction_history_user_recent
+            ON prediction_history(
+                user_id, id DESC, timestamp, filename, top_label, top_confidence, source
+            )
+            """
+        )
+        has_stats = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+        ).fetchone()
+        if not has_stats:
+            conn.execute("ANALYZE")
 
     def add(
         self,
@@ -83,28 +187,53 @@ class HistoryRepository:
         top_predictions: Optional[List[Dict[str, float]]] = None,
         user_id: Optional[int] = None,
     ) -> None:
+        self.add_many(
+            [
+                {
+                    "timestamp": timestamp,
+                    "filename": filename,
+                    "top_label": top_label,
+                    "top_confidence": top_confidence,
+                    "source": source,
+                    "top_predictions": top_predictions,
+                    "user_id": user_id,
+                }
+            ]
+        )
+
+    def add_many(self, rows: List[Dict[str, Any]]) -> None:
+        """Insert several history rows with one executemany and one commit."""
+        if not rows:
+            return
+
+        params = [self._row_params(**row) for row in rows]
+        with self._pool.writer() as conn:
+            conn.executemany(_INSERT_SQL, params)
+
+    @staticmethod
+    def _row_params(
+        *,
+        timestamp: str,
+        filename: str,
+        top_label: str,
+        top_confidence: float,
+        source: str,
+        top_predictions: Optional[List[Dict[str, float]]] = None,
+        user_id: Optional[int] = None,
+    ) -> Tuple[object, ...]:
         predictions_json = None
         if top_predictions is not None:
-            predictions_json = json.dumps(top_predictions, ensure_ascii=True)
-
-        with self._connect() as conn:
-            conn.execute(
-                """
-                INSERT INTO prediction_history
-                (user_id, timestamp, filename, top_label, top_confidence, source, top_predictions)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    user_id,
-                    timestamp,
-                    filename,
-                    top_label,
-                    top_confidence,
-                    source,
-                    predictions_json,
-                ),
-            )
-            conn.commit()
+            predictions_json = _dumps_predictions(top_predictions)
+        return (
+            user_id,
+            timestamp,
+            filename,
+            top_label,
+            top_label.lower(),
+            top_confidence,
+            source,
+            predictions_json,
+        )
 
     def list_recent(
         self,
@@ -116,61 +245,112 @@ class HistoryRepository:
         date_to: Optional[str] = None,
         include_predictions: bool = False,
         user_id: Optional[int] = None,
+        before_id: Optional[int] = None,
     ) -> List[Dict[str, object]]:
-        where_parts = []
-        params: List[object] = []
+        rows, _ = self._select_page(
+            limit=limit,
+            offset=offset,
+            source=source,
+            label=label,
+            date_from=date_from,
+            date_to=date_to,
+            include_predictions=include_predictions,
+            user_id=user_id,
+            before_id=before_id,
+            with_total=False,
+        )
+        return rows
 
-        if source:
-            where_parts.append("source = ?")
-            params.append(source)
-        if label:
-            where_parts.append("top_label LIKE ?")
-            params.append(f"%{label}%")
-        if date_from:
-            where_parts.append("timestamp >= ?")
-            params.append(date_from)
-        if date_to:
-            where_parts.append("timestamp <= ?")
-            params.append(date_to)
-        if user_id is not None:
-            where_parts.append("user_id = ?")
-            params.append(user_id)
+    def list_recent_with_total(
+        self,
+        limit: int = 200,
+        offset: int = 0,
+        source: Optional[str] = None,
+        label: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        include_predictions: bool = False,
+        user_id: Optional[int] = None,
+        before_id: Optional[int] = None,
+    ) -> Tuple[List[Dict[str, object]], int]:
+        """Return one page of rows plus the filtered total.
+
+        With ``before_id`` (keyset pagination) ``offset`` is ignored and the
+        total comes from a separate COUNT, since the window total would only
+        cover rows below the cursor. ``offset`` still works but costs
+        O(offset) row skips on deep pages.
+        """
+        keyset = before_id is not None
+        rows, total = self._select_page(
+            limit=limit,
+            offset=offset,
+            source=source,
+            label=label,
+            date_from=date_from,
+            date_to=date_to,
+            include_predictions=include_predictions,
+            user_id=user_id,
+            before_id=before_id,
+            with_total=not keyset,
+        )
+        if total is None and (keyset or offset > 0):
+            # Halaman kosong tidak membawa nilai window COUNT(*) OVER ().
+            total = self.count(
+                source=source,
+                label=label,
+                date_from=date_from,
+                date_to=date_to,
+                user_id=user_id,
+            )
+        return rows, total or 0
+
+    def _select_page(
+        self,
+        *,
+        limit: int,
+        offset: int,
+        source: Optional[str],
+        label: Optional[str],
+        date_from: Optional[str],
+        date_to: Optional[str],
+        include_predictions: bool,
+        user_id: Optional[int],
+        before_id: Optional[int],
+        with_total: bool,
+    ) -> Tuple[List[Dict[str, object]], Optional[int]]:
+        active_filters, params = self._build_filters(
+            source=source,
+            label=label,
+            date_from=date_from,
+            date_to=date_to,
+            user_id=user_id,
+            before_id=before_id,
+        )
+        sql = _select_page_sql(active_filters, include_predictions, with_total)
+        if before_id is None:
+            params.extend((limit, offset))
+        else:
+            params.append(limit)
 
-        where_clause = ""
-        if where_parts:
-            where_clause = "WHERE " + " AND ".join(where_parts)
-
-        select_columns = "timestamp, filename, top_label, top_confidence, source"
-        if include_predictions:
-            select_columns += ", top_predictions"
-
-        with self._connect() as conn:
-            rows = conn.execute(
-                f"""
-                SELECT {select_columns}
-                FROM prediction_history
-                {where_clause}
-                ORDER BY id DESC
-                LIMIT ? OFFSET ?
-                """,
-                (*params, limit, offset),
-            ).fetchall()
+        with self._pool.reader() as conn:
+            rows = conn.execute(sql, params).fetchall()
 
         result = []
         for row in rows:
             item = {
-                "timestamp": row[0],
-                "filename": row[1],
-                "top_label": row[2],
-                "top_confidence": f"{row[3]:.2f}",
-                "source": row[4],
+                "id": row[0],
+                "timestamp": row[1],
+                "filename": row[2],
+                "top_label": row[3],
+                "top_confidence": f"{row[4]:.2f}",
+                "source": row[5],
             }
             if include_predictions:
-                item["top_predictions"] = (
-                    json.loads(row[5]) if row[5] else []
-                )
+                item["top_predictions"] = _loads_predictions(row[6]) if row[6] else []
             result.append(item)
-        return result
+
+        total = int(rows[0][-1]) if with_total and rows else None
+        return result, total
 
     def count(
         self,
@@ -180,37 +360,54 @@ class HistoryRepository:
         date_to: Optional[str] = None,
         user_id: Optional[int] = None,
     ) -> int:
-        where_parts = []
+        active_filters, params = self._build_filters(
+            source=source,
+            label=label,
+            date_from=date_from,
+            date_to=date_to,
+            user_id=user_id,
+        )
+
+        with self._pool.reader() as conn:
+            row = conn.execute(_count_sql(active_filters), params).fetchone()
+        return int(row[0]) if row else 0
+
+    @staticmethod
+    def _build_filters(
+        *,
+        source: Optional[str],
+        label: Optional[str],
+        date_from: Optional[str],
+        date_to: Optional[str],
+        user_id: Optional[int],
+        before_id: Optional[int] = None,
+    ) -> Tuple[Tuple[str, ...], List[object]]:
+        """Return the active filter names (in fixed order) and their parameters."""
+        active: List[str] = []
         params: List[object] = []
 
         if source:
-            where_parts.append("source = ?")
+            active.append("source")
             params.append(source)
         if label:
-            where_parts.append("top_label LIKE ?")
-            params.append(f"%{label}%")
+            prefix = label.lower()
+            active.append("label")
+            params.extend((prefix, prefix + "\uffff"))
         if date_from:
-            where_parts.append("timestamp >= ?")
+            active.append("date_from")
             params.append(date_from)
         if date_to:
-            where_parts.append("timestamp <= ?")
+            active.append("date_to")
             params.append(date_to)
         if user_id is not None:
-            where_parts.append("user_id = ?")
+            active.append("user_id")
             params.append(user_id)
+        if before_id is not None:
+            active.append("before_id")
+            params.append(before_id)
 
-        where_clause = ""
-        if where_parts:
-            where_clause = "WHERE " + " AND ".join(where_parts)
-
-        with self._connect() as conn:
-            row = conn.execute(
-                f"SELECT COUNT(*) FROM prediction_history {where_clause}",
-                params,
-            ).fetchone()
-        return int(row[0]) if row else 0
+        return tuple(active), params
 
     def clear(self) -> None:
-        with self._connect() as conn:
+        with self._pool.writer() as conn:
             conn.execute("DELETE FROM prediction_history")
-            conn.commit()
@@ -1,28 +1,57 @@
 from __future__ import annotations
 
+import heapq
 import os
 import re
+import shutil
 import tempfile
 import urllib.parse
 import urllib.request
 from dataclasses import dataclass
 from html import unescape
-from io import BytesIO
+from itertools import chain
 from pathlib import Path
-from typing import Dict, List, Literal
-
-from PIL import Image, UnidentifiedImageError
-
-from src.classifier import Prediction, analyze_image, generate_insight
+from typing import BinaryIO, Dict, List, Literal
+
+import torch
+from PIL import UnidentifiedImageError
+
+from src.classifier import (
+    Prediction,
+    analyze_image,
+    decode_image,
+    preprocess_array,
+    run_model,
+    summarize_predictions,
+    top_predictions_batch,
+    validate_analysis_params,
+)
 
 MAX_DOWNLOAD_BYTES = 50 * 1024 * 1024
 DEFAULT_VIDEO_SAMPLE_EVERY = 15
 DEFAULT_VIDEO_MAX_FRAMES = 12
+VIDEO_COPY_BUFFER_BYTES = 1024 * 1024
 
 MediaKind = Literal["image", "video"]
 
+_YOUTUBE_HOSTS = frozenset({"youtube.com", "youtu.be", "m.youtube.com", "www.youtu.be"})
+
+# Dikompilasi sekali; urutan = prioritas (OpenGraph/Twitter lalu tag media).
+_MEDIA_URL_PATTERNS = tuple(
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (
+        r'<meta[^>]+property=["\']og:video(?::url|:secure_url)?["\'][^>]+content=["\']([^"\']+)["\']',
+        r'<meta[^>]+name=["\']twitter:player:stream["\'][^>]+content=["\']([^"\']+)["\']',
+        r'<meta[^>]+property=["\']og:image(?::url|:secure_url)?["\'][^>]+content=["\']([^"\']+)["\']',
+        r'<meta[^>]+name=["\']twitter:image(?::src)?["\'][^>]+content=["\']([^"\']+)["\']',
+        r'<video[^>]+src=["\']([^"\']+)["\']',
+        r'<source[^>]+src=["\']([^"\']+)["\']',
+        r'<img[^>]+src=["\']([^"\']+)["\']',
+    )
+)
+
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class VideoAnalysis:
     predictions: List[Prediction]
     filtered: List[Prediction]
@@ -50,7 +79,7 @@ def _fetch_url_bytes(
         raise ValueError("Terjadi loop URL saat mengambil media")
     visited.add(normalized_url)
 
-    if is_youtube_url(url):
+    if is_youtube_host(parsed):
         return download_youtube_video_bytes(url)
 
     content, content_type, final_url = _download_url_bytes(url=url, timeout=timeout)
@@ -81,76 +110,96 @@ def _download_url_bytes(url: str, timeout: int) -> tuple[bytes, str, str]:
         headers={"User-Agent": "ImageRecognitionApp/1.0"},
     )
     with urllib.request.urlopen(req, timeout=timeout) as resp:
+        # Tolak lebih awal bila server sudah mengumumkan ukuran di atas batas.
+        if declared_content_length(resp) > MAX_DOWNLOAD_BYTES:
+            raise ValueError("File dari URL terlalu besar (maks 50MB)")
         content_type = resp.headers.get("Content-Type", "")
-        content = resp.read(MAX_DOWNLOAD_BYTES + 1)
         final_url = resp.geturl() or url
+        buffer = bytearray()
+        for chunk in iter(lambda: resp.read(VIDEO_COPY_BUFFER_BYTES), b""):
+            buffer += chunk
+            if len(buffer) > MAX_DOWNLOAD_BYTES:
+                raise ValueError("File dari URL terlalu besar (maks 50MB)")
+
+    return bytes(buffer), content_type, final_url
 
-    if len(content) > MAX_DOWNLOAD_BYTES:
-        raise ValueError("File dari URL terlalu besar (maks 50MB)")
-    return content, content_type, final_url
+
+def declared_content_length(resp) -> int:
+    """Return the response Content-Length, or -1 when absent or invalid."""
+    try:
+        return int(resp.headers.get("Content-Length", -1))
+    except (TypeError, ValueError):
+        return -1
 
 
 def _looks_like_html(raw: bytes) -> bool:
-    snippet = raw[:1024].decode("utf-8", errors="ignore").lower()
-    return "<html" in snippet or "<!doctype html" in snippet
+    # Dicek pada level byte; tidak perlu decode hanya untuk sniffing.
+    head = raw[:1024].lower()
+    return b"<html" in head or b"<!doctype html" in head
 
 
 def is_youtube_url(url: str) -> bool:
-    parsed = urllib.parse.urlparse(url)
-    host = (parsed.netloc or "").lower()
-    return (
-        "youtube.com" in host
-        or "youtu.be" in host
-        or "m.youtube.com" in host
-    )
+    return is_youtube_host(urllib.parse.urlparse(url))
+
+
+def is_youtube_host(parsed: urllib.parse.ParseResult) -> bool:
+    """Check an already-parsed URL so callers do not parse it twice."""
+    # hostname sudah lowercase dan tanpa port/userinfo.
+    host = parsed.hostname or ""
+    return host in _YOUTUBE_HOSTS or host.endswith(".youtube.com")
 
 
 def download_youtube_video_bytes(url: str) -> tuple[bytes, str]:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        final_path, content_type = download_youtube_video_file(url, tmpdir)
+        with open(final_path, "rb") as f:
+            raw = f.read()
+        return raw, content_type
+
+
+def download_youtube_video_file(url: str, tmpdir: str) -> tuple[str, str]:
+    """Download a YouTube video into tmpdir and return (path, content_type)."""
     try:
         import yt_dlp  # type: ignore
     except ImportError as exc:
         raise RuntimeError("yt-dlp belum terpasang untuk URL YouTube") from exc
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        output_template = os.path.join(tmpdir, "yt_video.%(ext)s")
-        opts = {
-            "quiet": True,
-            "no_warnings": True,
-            "outtmpl": output_template,
-            # Hindari merge audio+video agar tetap jalan tanpa ffmpeg.
-            "format": "bv*[height<=720]/bestvideo[height<=720]/best[height<=720]/best",
-            "max_filesize": MAX_DOWNLOAD_BYTES,
-            "noplaylist": True,
-        }
-
-        try:
-            with yt_dlp.YoutubeDL(opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                downloaded = ydl.prepare_filename(info)
-        except Exception as exc:
-            raise ValueError(f"Gagal mengambil video YouTube: {exc}") from exc
-
-        final_path = _resolve_downloaded_video_path(
-            info=info,
-            prepared_filename=downloaded,
-            tmpdir=tmpdir,
-        )
+    output_template = os.path.join(tmpdir, "yt_video.%(ext)s")
+    opts = {
+        "quiet": True,
+        "no_warnings": True,
+        "outtmpl": output_template,
+        # Hindari merge audio+video agar tetap jalan tanpa ffmpeg.
+        "format": "bv*[height<=720]/bestvideo[height<=720]/best[height<=720]/best",
+        "max_filesize": MAX_DOWNLOAD_BYTES,
+        "noplaylist": True,
+    }
 
-        if not os.path.exists(final_path):
-            raise ValueError("File video YouTube tidak ditemukan setelah download")
+    try:
+        with yt_dlp.YoutubeDL(opts) as ydl:
+            info = ydl.extract_info(url, download=True)
+            downloaded = ydl.prepare_filename(info)
+    except Exception as exc:
+        raise ValueError(f"Gagal mengambil video YouTube: {exc}") from exc
+
+    final_path = _resolve_downloaded_video_path(
+        info=info,
+        prepared_filename=downloaded,
+        tmpdir=tmpdir,
+    )
 
-        with open(final_path, "rb") as f:
-            raw = f.read(MAX_DOWNLOAD_BYTES + 1)
-        if len(raw) > MAX_DOWNLOAD_BYTES:
-            raise ValueError("Video YouTube terlalu besar (maks 50MB)")
-        ext = Path(final_path).suffix.lower()
-        content_type = {
-            ".mp4": "video/mp4",
-            ".webm": "video/webm",
-            ".mkv": "video/x-matroska",
-            ".mov": "video/quicktime",
-        }.get(ext, "video/mp4")
-        return raw, content_type
+    if not os.path.exists(final_path):
+        raise ValueError("File video YouTube tidak ditemukan setelah download")
+    if os.path.getsize(final_path) > MAX_DOWNLOAD_BYTES:
+        raise ValueError("Video YouTube terlalu besar (maks 50MB)")
+    ext = Path(final_path).suffix.lower()
+    content_type = {
+        ".mp4": "video/mp4",
+        ".webm": "video/webm",
+        ".mkv": "video/x-matroska",
+        ".mov": "video/quicktime",
+    }.get(ext, "video/mp4")
+    return final_path, content_type
 
 
 def _resolve_downloaded_video_path(
@@ -217,19 +266,10 @@ def detect_media_kind(
 
 def extract_media_urls_from_html(html: str, base_url: str) -> List[str]:
     # Prioritaskan metadata OpenGraph/Twitter lalu fallback ke tag media.
-    patterns = [
-        r'<meta[^>]+property=["\']og:video(?::url|:secure_url)?["\'][^>]+content=["\']([^"\']+)["\']',
-        r'<meta[^>]+name=["\']twitter:player:stream["\'][^>]+content=["\']([^"\']+)["\']',
-        r'<meta[^>]+property=["\']og:image(?::url|:secure_url)?["\'][^>]+content=["\']([^"\']+)["\']',
-        r'<meta[^>]+name=["\']twitter:image(?::src)?["\'][^>]+content=["\']([^"\']+)["\']',
-        r'<video[^>]+src=["\']([^"\']+)["\']',
-        r'<source[^>]+src=["\']([^"\']+)["\']',
-        r'<img[^>]+src=["\']([^"\']+)["\']',
-    ]
-    candidates: List[str] = []
-    seen = set()
-    for pattern in patterns:
-        for match in re.findall(pattern, html, flags=re.IGNORECASE):
+    # dict menjaga urutan sisip sekaligus berfungsi sebagai set dedupe.
+    candidates: Dict[str, None] = {}
+    for pattern in _MEDIA_URL_PATTERNS:
+        for match in pattern.findall(html):
             raw_url = unescape(match.strip())
             if not raw_url:
                 continue
@@ -238,11 +278,8 @@ def extract_media_urls_from_html(html: str, base_url: str) -> List[str]:
             parsed = urllib.parse.urlparse(absolute)
             if parsed.scheme not in {"http", "https"}:
                 continue
-            if absolute in seen:
-                continue
-            seen.add(absolute)
-            candidates.append(absolute)
-    return candidates
+            candidates.setdefault(absolute, None)
+    return list(candidates)
 
 
 def analyze_image_bytes(
@@ -252,7 +289,7 @@ def analyze_image_bytes(
     min_conf: float,
 ) -> tuple[List[Prediction], List[Prediction], str]:
     try:
-        image = Image.open(BytesIO(raw)).convert("RGB")
+        image = decode_image(raw)
     except (UnidentifiedImageError, OSError) as exc:
         raise ValueError("Konten bukan gambar valid") from exc
     return analyze_image(image=image, top_k=top_k, min_conf=min_conf)
@@ -266,20 +303,21 @@ def _aggregate_predictions(
     if not all_predictions:
         return []
 
-    score_sum: Dict[str, float] = {}
-    count: Dict[str, int] = {}
+    # [jumlah confidence, jumlah kemunculan] per label: satu lookup per item.
+    totals: Dict[str, List[float]] = {}
 
-    for frame_predictions in all_predictions:
-        for item in frame_predictions:
-            score_sum[item.label] = score_sum.get(item.label, 0.0) + item.confidence
-            count[item.label] = count.get(item.label, 0) + 1
+    for item in chain.from_iterable(all_predictions):
+        entry = totals.get(item.label)
+        if entry is None:
+            totals[item.label] = [item.confidence, 1]
+        else:
+            entry[0] += item.confidence
+            entry[1] += 1
 
-    averaged = [
-        Prediction(label=label, confidence=(score_sum[label] / count[label]))
-        for label in score_sum
-    ]
-    averaged.sort(key=lambda x: x.confidence, reverse=True)
-    return averaged[:top_k]
+    means = {label: score / count for label, (score, count) in totals.items()}
+    # nlargest stabil seperti sort(reverse=True), tanpa sort semua label.
+    best = heapq.nlargest(top_k, means, key=means.__getitem__)
+    return [Prediction(label=label, confidence=means[label]) for label in best]
 
 
 def analyze_video_bytes(
@@ -289,44 +327,102 @@ def analyze_video_bytes(
     min_conf: float,
     sample_every_n_frames: int = DEFAULT_VIDEO_SAMPLE_EVERY,
     max_sampled_frames: int = DEFAULT_VIDEO_MAX_FRAMES,
+) -> VideoAnalysis:
+    with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as tmp:
+        tmp.write(raw)
+        temp_path = tmp.name
+
+    try:
+        return analyze_video_path(
+            temp_path,
+            top_k=top_k,
+            min_conf=min_conf,
+            sample_every_n_frames=sample_every_n_frames,
+            max_sampled_frames=max_sampled_frames,
+        )
+    finally:
+        _remove_file(temp_path)
+
+
+def analyze_video_stream(
+    stream: BinaryIO,
+    *,
+    top_k: int,
+    min_conf: float,
+    suffix: str = ".mp4",
+    sample_every_n_frames: int = DEFAULT_VIDEO_SAMPLE_EVERY,
+    max_sampled_frames: int = DEFAULT_VIDEO_MAX_FRAMES,
+) -> VideoAnalysis:
+    """Copy a file-like video to disk in fixed-size chunks, then analyze it."""
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        shutil.copyfileobj(stream, tmp, length=VIDEO_COPY_BUFFER_BYTES)
+        temp_path = tmp.name
+
+    try:
+        return analyze_video_path(
+            temp_path,
+            top_k=top_k,
+            min_conf=min_conf,
+            sample_every_n_frames=sample_every_n_frames,
+            max_sampled_frames=max_sampled_frames,
+        )
+    finally:
+        _remove_file(temp_path)
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def analyze_video_path(
+    path: str,
+    *,
+    top_k: int,
+    min_conf: float,
+    sample_every_n_frames: int = DEFAULT_VIDEO_SAMPLE_EVERY,
+    max_sampled_frames: int = DEFAULT_VIDEO_MAX_FRAMES,
 ) -> VideoAnalysis:
     try:
         import cv2  # type: ignore
     except ImportError as exc:
         raise RuntimeError("opencv-python-headless belum terpasang") from exc
 
+    # Validasi sebelum membuka video agar input salah tidak men-decode frame.
+    validate_analysis_params(top_k, min_conf)
     if sample_every_n_frames < 1:
         raise ValueError("sample_every_n_frames harus >= 1")
     if max_sampled_frames < 1:
         raise ValueError("max_sampled_frames harus >= 1")
 
-    with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as tmp:
-        tmp.write(raw)
-        temp_path = tmp.name
-
     sampled_frames = 0
     total_frames = 0
-    collected: List[List[Prediction]] = []
-    capture = cv2.VideoCapture(temp_path)
+    # Frame sampel langsung di-preprocess ke tensor 224x224 (bukan disimpan
+    # utuh), lalu semuanya diklasifikasi dalam satu forward pass.
+    tensors: List[torch.Tensor] = []
+    capture = cv2.VideoCapture(path)
     try:
         if not capture.isOpened():
             raise ValueError("Video tidak dapat dibuka")
 
+        # grab() memajukan decoder tanpa konversi warna/salin buffer; hanya
+        # frame sampel yang di-retrieve(). Seek via CAP_PROP_POS_FRAMES tidak
+        # dipakai karena backend FFmpeg tetap mendekode dari keyframe
+        # sebelumnya, yang lebih mahal untuk jarak sampel kecil.
         frame_idx = 0
-        while True:
-            ok, frame = capture.read()
-            if not ok:
-                break
-
+        while capture.grab():
             total_frames += 1
             if frame_idx % sample_every_n_frames != 0:
                 frame_idx += 1
                 continue
 
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            image = Image.fromarray(rgb)
-            predictions, _, _ = analyze_image(image=image, top_k=top_k, min_conf=0.0)
-            collected.append(predictions)
+            ok, frame = capture.retrieve()
+            if not ok:
+                break
+            # Frame BGR langsung jadi tensor tanpa Image.fromarray/cvtColor.
+            tensors.append(preprocess_array(frame, bgr=True))
             sampled_frames += 1
             frame_idx += 1
 
@@ -334,20 +430,14 @@ def analyze_video_bytes(
                 break
     finally:
         capture.release()
-        try:
-            os.remove(temp_path)
-        except OSError:
-            pass
 
     if sampled_frames == 0:
         raise ValueError("Tidak ada frame yang bisa dianalisis dari video")
 
+    collected = top_predictions_batch(run_model(torch.stack(tensors)), top_k=top_k)
     predictions = _aggregate_predictions(collected, top_k=top_k)
-    filtered = [item for item in predictions if item.confidence >= min_conf]
-    insight = (
-        f"Analisis video dari {sampled_frames} frame sampel. "
-        + generate_insight(filtered or predictions)
-    )
+    predictions, filtered, summary = summarize_predictions(predictions, min_conf=min_conf)
+    insight = f"Analisis video dari {sampled_frames} frame sampel. {summary}"
     return VideoAnalysis(
         predictions=predictions,
         filtered=filtered,
@@ -1,4 +1,6 @@
-from typing import Dict
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Mapping
 
 LABEL_MAP_ID: Dict[str, str] = {
     "cat": "kucing",
@@ -29,7 +31,18 @@ LABEL_MAP_ID: Dict[str, str] = {
 }
 
 
+# Bahasa tanpa tabel berbagi satu mapping kosong read-only; `language`
+# berasal dari query parameter, jadi hasilnya tidak di-cache per string.
+_EMPTY_TABLE: Mapping[str, str] = MappingProxyType({})
+
+
+def get_translation_table(language: str) -> Mapping[str, str]:
+    """Return the label -> translated label table for a language."""
+    if language == "id":
+        return LABEL_MAP_ID
+    return _EMPTY_TABLE
+
+
+@lru_cache(maxsize=1024)
 def translate_label(label: str, language: str = "id") -> str:
-    if language != "id":
-        return label
-    return LABEL_MAP_ID.get(label, label)
+    return get_translation_table(language).get(label, label)
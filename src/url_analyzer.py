@@ -1,26 +1,42 @@
 from __future__ import annotations
 
+import os
 import re
+import tempfile
 import urllib.parse
 import urllib.request
 from collections import Counter
 from dataclasses import dataclass
 from html import unescape
 from io import BytesIO
-from typing import Any, Dict, List, Literal, Optional
+from typing import Any, BinaryIO, Dict, List, Literal, Optional
 
 from src.classifier import Prediction
 from src.media import (
+    VIDEO_COPY_BUFFER_BYTES,
     analyze_image_bytes,
-    analyze_video_bytes,
-    download_youtube_video_bytes,
-    is_youtube_url,
+    analyze_video_path,
+    declared_content_length,
+    download_youtube_video_file,
+    is_youtube_host,
 )
 
 ContentKind = Literal["image", "video", "webpage", "pdf", "text", "unknown"]
 
 MAX_DOWNLOAD_BYTES = 50 * 1024 * 1024
-STOPWORDS = {
+SNIFF_BYTES = 1024
+KEYWORD_SCAN_CHARS = 200_000
+PDF_MAX_PAGES = 10
+
+_TITLE_RE = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+# Script dan style dibuang dalam satu pemindaian (backreference ke nama tag).
+_SCRIPT_STYLE_RE = re.compile(
+    r"<(script|style)\b.*?>.*?</\1>", re.IGNORECASE | re.DOTALL
+)
+_TAG_RE = re.compile(r"<[^>]+>")
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+")
+_WORD_RE = re.compile(r"[A-Za-zÀ-ÿ][A-Za-zÀ-ÿ0-9_-]{2,}")
+STOPWORDS = frozenset({
     "the",
     "and",
     "for",
@@ -52,10 +68,10 @@ STOPWORDS = {
     "ada",
     "juga",
     "saat",
-}
+})
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class URLAnalysisResult:
     url: str
     final_url: str
@@ -83,15 +99,17 @@ def analyze_url(
     if parsed.scheme not in {"http", "https"}:
         raise ValueError("URL harus menggunakan http/https")
 
-    if is_youtube_url(url):
-        raw, content_type = download_youtube_video_bytes(url)
-        analyzed = analyze_video_bytes(
-            raw,
-            top_k=top_k,
-            min_conf=min_conf,
-            sample_every_n_frames=sample_every_n_frames,
-            max_sampled_frames=max_sampled_frames,
-        )
+    if is_youtube_host(parsed):
+        # File hasil yt-dlp langsung dianalisis dari disk tanpa dibaca ke RAM.
+        with tempfile.TemporaryDirectory() as tmpdir:
+            video_path, content_type = download_youtube_video_file(url, tmpdir)
+            analyzed = analyze_video_path(
+                video_path,
+                top_k=top_k,
+                min_conf=min_conf,
+                sample_every_n_frames=sample_every_n_frames,
+                max_sampled_frames=max_sampled_frames,
+            )
         return URLAnalysisResult(
             url=url,
             final_url=url,
@@ -105,13 +123,50 @@ def analyze_url(
             document=None,
         )
 
-    raw, content_type, final_url = _download_url_resource(url, timeout=timeout)
-    kind = _classify_content(
-        mode=mode,
-        url=final_url,
-        content_type=content_type,
-        raw=raw,
-    )
+    # Respons di-stream ke file sementara; video dianalisis langsung dari
+    # file itu, jenis lain baru dibaca ke memori setelah diklasifikasi.
+    with tempfile.NamedTemporaryFile(delete=False) as tmp:
+        temp_path = tmp.name
+    try:
+        with open(temp_path, "wb") as dest:
+            content_type, final_url = _download_url_resource(
+                url, timeout=timeout, dest=dest
+            )
+        with open(temp_path, "rb") as f:
+            head = f.read(SNIFF_BYTES)
+        kind = _classify_content(
+            mode=mode,
+            url=final_url,
+            content_type=content_type,
+            raw=head,
+        )
+        if kind == "video":
+            analyzed = analyze_video_path(
+                temp_path,
+                top_k=top_k,
+                min_conf=min_conf,
+                sample_every_n_frames=sample_every_n_frames,
+                max_sampled_frames=max_sampled_frames,
+            )
+            return URLAnalysisResult(
+                url=url,
+                final_url=final_url,
+                content_type=content_type,
+                content_kind="video",
+                insight=analyzed.insight,
+                predictions=analyzed.predictions,
+                filtered_predictions=analyzed.filtered,
+                sampled_frames=analyzed.sampled_frames,
+                total_frames=analyzed.total_frames,
+                document=None,
+            )
+        with open(temp_path, "rb") as f:
+            raw = f.read()
+    finally:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
 
     if kind == "image":
         predictions, filtered, insight = analyze_image_bytes(
@@ -132,30 +187,11 @@ def analyze_url(
             document=None,
         )
 
-    if kind == "video":
-        analyzed = analyze_video_bytes(
-            raw,
-            top_k=top_k,
-            min_conf=min_conf,
-            sample_every_n_frames=sample_every_n_frames,
-            max_sampled_frames=max_sampled_frames,
-        )
-        return URLAnalysisResult(
-            url=url,
-            final_url=final_url,
-            content_type=content_type,
-            content_kind="video",
-            insight=analyzed.insight,
-            predictions=analyzed.predictions,
-            filtered_predictions=analyzed.filtered,
-            sampled_frames=analyzed.sampled_frames,
-            total_frames=analyzed.total_frames,
-            document=None,
-        )
-
     if kind == "pdf":
         text = _extract_pdf_text(raw)
-        document = _build_document_analysis(text=text, title="PDF Document")
+        document = _build_document_analysis(
+            text=text, title="PDF Document", pre_normalized=True
+        )
         return URLAnalysisResult(
             url=url,
             final_url=final_url,
@@ -171,7 +207,9 @@ def analyze_url(
 
     if kind == "webpage":
         title, text = _extract_webpage_text(raw)
-        document = _build_document_analysis(text=text, title=title or "Web Page")
+        document = _build_document_analysis(
+            text=text, title=title or "Web Page", pre_normalized=True
+        )
         return URLAnalysisResult(
             url=url,
             final_url=final_url,
@@ -204,16 +242,25 @@ def analyze_url(
     raise ValueError("URL tidak dikenali sebagai media atau dokumen yang didukung")
 
 
-def _download_url_resource(url: str, timeout: int) -> tuple[bytes, str, str]:
+def _download_url_resource(url: str, timeout: int, dest: BinaryIO) -> tuple[str, str]:
+    """Stream the response body into dest in chunks; return (content_type, final_url)."""
     req = urllib.request.Request(url, headers={"User-Agent": "MultimediaRecognitionApp/1.0"})
     with urllib.request.urlopen(req, timeout=timeout) as resp:
+        # Tolak lebih awal bila server sudah mengumumkan ukuran di atas batas.
+        if declared_content_length(resp) > MAX_DOWNLOAD_BYTES:
+            raise ValueError("Ukuran file terlalu besar (maks 50MB)")
         content_type = resp.headers.get("Content-Type", "")
-        raw = resp.read(MAX_DOWNLOAD_BYTES + 1)
         final_url = resp.geturl() or url
-
-    if len(raw) > MAX_DOWNLOAD_BYTES:
-        raise ValueError("Ukuran file terlalu besar (maks 50MB)")
-    return raw, content_type, final_url
+        written = 0
+        while True:
+            chunk = resp.read(VIDEO_COPY_BUFFER_BYTES)
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > MAX_DOWNLOAD_BYTES:
+                raise ValueError("Ukuran file terlalu besar (maks 50MB)")
+            dest.write(chunk)
+    return content_type, final_url
 
 
 def _classify_content(
@@ -248,48 +295,63 @@ def _classify_content(
 
 
 def _looks_like_html(raw: bytes) -> bool:
-    head = raw[:1024].decode("utf-8", errors="ignore").lower()
-    return "<html" in head or "<!doctype html" in head
+    # Dicek pada level byte; tidak perlu decode hanya untuk sniffing.
+    head = raw[:1024].lower()
+    return b"<html" in head or b"<!doctype html" in head
 
 
 def _extract_webpage_text(raw: bytes) -> tuple[str, str]:
     html = raw.decode("utf-8", errors="ignore")
-    title_match = re.search(r"<title[^>]*>(.*?)</title>", html, re.IGNORECASE | re.DOTALL)
+    title_match = _TITLE_RE.search(html)
     title = unescape(title_match.group(1).strip()) if title_match else ""
 
-    cleaned = re.sub(r"<script.*?>.*?</script>", " ", html, flags=re.IGNORECASE | re.DOTALL)
-    cleaned = re.sub(r"<style.*?>.*?</style>", " ", cleaned, flags=re.IGNORECASE | re.DOTALL)
-    cleaned = re.sub(r"<[^>]+>", " ", cleaned)
+    cleaned = _SCRIPT_STYLE_RE.sub(" ", html)
+    cleaned = _TAG_RE.sub(" ", cleaned)
     cleaned = unescape(cleaned)
-    cleaned = re.sub(r"\s+", " ", cleaned).strip()
+    cleaned = " ".join(cleaned.split())
     return title, cleaned
 
 
 def _extract_pdf_text(raw: bytes) -> str:
+    # PyMuPDF (MuPDF, C) jauh lebih cepat; opsional karena berlisensi AGPL.
+    try:
+        import pymupdf
+    except ImportError:
+        parts = _extract_pdf_pages_pypdf(raw)
+    else:
+        with pymupdf.open(stream=raw, filetype="pdf") as doc:
+            parts = [
+                doc.load_page(index).get_text("text")
+                for index in range(min(PDF_MAX_PAGES, doc.page_count))
+            ]
+    # str.split() tanpa argumen sekaligus memadatkan dan men-trim spasi.
+    return " ".join(" ".join(parts).split())
+
+
+def _extract_pdf_pages_pypdf(raw: bytes) -> List[str]:
     try:
         from pypdf import PdfReader
     except ImportError as exc:
         raise RuntimeError("pypdf belum terpasang untuk analisis PDF") from exc
 
     reader = PdfReader(BytesIO(raw))
-    parts = []
-    for page in reader.pages[:10]:
-        parts.append(page.extract_text() or "")
-    text = " ".join(parts)
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
+    return [page.extract_text() or "" for page in reader.pages[:PDF_MAX_PAGES]]
 
 
-def _build_document_analysis(text: str, title: str) -> Dict[str, Any]:
-    normalized = re.sub(r"\s+", " ", text).strip()
-    sentences = re.split(r"(?<=[.!?])\s+", normalized)
+def _build_document_analysis(
+    text: str, title: str, pre_normalized: bool = False
+) -> Dict[str, Any]:
+    normalized = text if pre_normalized else " ".join(text.split())
+    sentences = _SENTENCE_SPLIT_RE.split(normalized)
     summary = " ".join(sentences[:3]).strip() if sentences else ""
     if not summary:
         summary = "Konten teks sangat pendek atau tidak dapat diekstrak."
 
-    words = re.findall(r"[A-Za-zÀ-ÿ][A-Za-zÀ-ÿ0-9_-]{2,}", normalized.lower())
-    filtered = [w for w in words if w not in STOPWORDS]
-    keywords = [w for w, _ in Counter(filtered).most_common(10)]
+    # Hanya 10 keyword teratas yang dilaporkan, jadi teks sangat panjang
+    # cukup dipindai sampai KEYWORD_SCAN_CHARS.
+    words = _WORD_RE.findall(normalized[:KEYWORD_SCAN_CHARS].lower())
+    counter = Counter(word for word in words if word not in STOPWORDS)
+    keywords = [w for w, _ in counter.most_common(10)]
 
     return {
         "title": title,
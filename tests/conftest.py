@@ -0,0 +1,37 @@
+import os
+import tempfile
+
+import pytest
+
+# Harus diset sebelum api diimpor oleh modul test mana pun. Repository global
+# api memakai DB sementara; tiap test menggantinya via dependency_overrides.
+os.environ.setdefault(
+    "APP_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="app-test-"), "history.db")
+)
+
+
+@pytest.fixture(autouse=True)
+def cheap_password_hasher(monkeypatch):
+    # Parameter Argon2 termurah hanya di test; kode produksi tidak punya
+    # saklar untuk menurunkan biaya hash.
+    import argon2.profiles
+    from argon2 import PasswordHasher
+
+    import src.auth
+
+    monkeypatch.setattr(
+        src.auth,
+        "_PASSWORD_HASHER",
+        PasswordHasher.from_parameters(argon2.profiles.CHEAPEST),
+    )
+
+
+@pytest.fixture(scope="session")
+def api_client():
+    # Satu app + TestClient per sesi; isolasi DB dilakukan per test.
+    from fastapi.testclient import TestClient
+
+    from api import app
+
+    return TestClient(app)
+
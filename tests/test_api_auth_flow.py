@@ -1,15 +1,39 @@
-import importlib
-
+import pytest
 from fastapi.testclient import TestClient
 
-
-def _client_with_temp_db(tmp_path, monkeypatch):
-    db_path = tmp_path / "api_test.db"
-    monkeypatch.setenv("APP_DB_PATH", str(db_path))
-    import api as api_module
-
-    importlib.reload(api_module)
-    return TestClient(api_module.app)
+import api as api_module
+from src.auth import AuthRepository
+from src.classifier import Prediction
+from src.history import HistoryRepository
+from src.url_analyzer import URLAnalysisResult
+
+_CAT = Prediction(label="cat", confidence=88.0)
+_FAKE_URL_RESULT = URLAnalysisResult(
+    url="https://example.com/a.png",
+    final_url="https://example.com/a.png",
+    content_type="image/png",
+    content_kind="image",
+    insight="ok",
+    predictions=[_CAT],
+    filtered_predictions=[_CAT],
+    sampled_frames=None,
+    total_frames=None,
+    document=None,
+)
+
+
+@pytest.fixture
+def client(api_client: TestClient, tmp_path):
+    db_path = str(tmp_path / "api_test.db")
+    history_repo = HistoryRepository(db_path)
+    auth_repo = AuthRepository(db_path)
+    overrides = api_module.app.dependency_overrides
+    overrides[api_module.get_history_repo] = lambda: history_repo
+    overrides[api_module.get_auth_repo] = lambda: auth_repo
+    yield api_client
+    overrides.clear()
+    history_repo.close()
+    auth_repo.close()
 
 
 def _register(client: TestClient, username: str, role: str = "user") -> dict:
@@ -25,14 +49,12 @@ def _register(client: TestClient, username: str, role: str = "user") -> dict:
     return response.json()
 
 
-def test_protected_endpoint_requires_token(tmp_path, monkeypatch):
-    client = _client_with_temp_db(tmp_path, monkeypatch)
+def test_protected_endpoint_requires_token(client):
     response = client.get("/history")
     assert response.status_code == 401
 
 
-def test_admin_can_list_users(tmp_path, monkeypatch):
-    client = _client_with_temp_db(tmp_path, monkeypatch)
+def test_admin_can_list_users(client):
 
     admin = _register(client, "admin01", role="admin")
     _register(client, "user01", role="user")
@@ -47,8 +69,7 @@ def test_admin_can_list_users(tmp_path, monkeypatch):
     assert len(payload["rows"]) >= 2
 
 
-def test_non_admin_cannot_list_users(tmp_path, monkeypatch):
-    client = _client_with_temp_db(tmp_path, monkeypatch)
+def test_non_admin_cannot_list_users(client):
     user = _register(client, "user02", role="user")
 
     response = client.get(
@@ -58,16 +79,14 @@ def test_non_admin_cannot_list_users(tmp_path, monkeypatch):
     assert response.status_code == 403
 
 
-def test_history_scoped_to_logged_in_user(tmp_path, monkeypatch):
-    client = _client_with_temp_db(tmp_path, monkeypatch)
+def test_history_scoped_to_logged_in_user(client, tmp_path):
 
     user_a = _register(client, "alice01", role="user")
     user_b = _register(client, "bob01", role="user")
 
-    db_path = tmp_path / "api_test.db"
     import sqlite3
 
-    with sqlite3.connect(db_path) as conn:
+    with sqlite3.connect(tmp_path / "api_test.db") as conn:
         conn.execute(
             """
             INSERT INTO prediction_history
@@ -96,8 +115,7 @@ def test_history_scoped_to_logged_in_user(tmp_path, monkeypatch):
     assert payload["rows"][0]["filename"] == "a.jpg"
 
 
-def test_history_date_validation(tmp_path, monkeypatch):
-    client = _client_with_temp_db(tmp_path, monkeypatch)
+def test_history_date_validation(client):
     user = _register(client, "dateuser01", role="user")
     headers = {"Authorization": f"Bearer {user['access_token']}"}
 
@@ -111,8 +129,7 @@ def test_history_date_validation(tmp_path, monkeypatch):
     assert invalid_range.status_code == 400
 
 
-def test_refresh_rotates_token_and_old_refresh_is_rejected(tmp_path, monkeypatch):
-    client = _client_with_temp_db(tmp_path, monkeypatch)
+def test_refresh_rotates_token_and_old_refresh_is_rejected(client):
     user = _register(client, "rotate01", role="user")
 
     first_refresh = user["refresh_token"]
@@ -126,8 +143,7 @@ def test_refresh_rotates_token_and_old_refresh_is_rejected(tmp_path, monkeypatch
     assert old_reuse.status_code == 401
 
 
-def test_logout_revokes_access_token(tmp_path, monkeypatch):
-    client = _client_with_temp_db(tmp_path, monkeypatch)
+def test_logout_revokes_access_token(client):
     user = _register(client, "logout01", role="user")
     headers = {"Authorization": f"Bearer {user['access_token']}"}
 
@@ -145,31 +161,11 @@ def test_logout_revokes_access_token(tmp_path, monkeypatch):
     assert after.status_code == 401
 
 
-def test_predict_url_image_with_mocked_media(tmp_path, monkeypatch):
-    client = _client_with_temp_db(tmp_path, monkeypatch)
+def test_predict_url_image_with_mocked_media(client, monkeypatch):
     user = _register(client, "urluser01", role="user")
     headers = {"Authorization": f"Bearer {user['access_token']}"}
 
-    import api as api_module
-    from src.classifier import Prediction
-    from src.url_analyzer import URLAnalysisResult
-
-    monkeypatch.setattr(
-        api_module,
-        "analyze_url",
-        lambda **kwargs: URLAnalysisResult(
-            url=kwargs["url"],
-            final_url=kwargs["url"],
-            content_type="image/png",
-            content_kind="image",
-            insight="ok",
-            predictions=[Prediction(label="cat", confidence=88.0)],
-            filtered_predictions=[Prediction(label="cat", confidence=88.0)],
-            sampled_frames=None,
-            total_frames=None,
-            document=None,
-        ),
-    )
+    monkeypatch.setattr(api_module, "analyze_url", lambda **_: _FAKE_URL_RESULT)
 
     response = client.post(
         "/predict/url",
@@ -181,3 +177,53 @@ def test_predict_url_image_with_mocked_media(tmp_path, monkeypatch):
     assert payload["content_kind"] == "image"
     assert payload["count"] == 1
     assert payload["predictions"][0]["label_raw"] == "cat"
+
+
+def test_predict_batch_keeps_file_order_and_errors(client, monkeypatch):
+    user = _register(client, "batchuser01", role="user")
+    headers = {"Authorization": f"Bearer {user['access_token']}"}
+
+    from io import BytesIO
+
+    from PIL import Image
+
+    monkeypatch.setattr(
+        api_module,
+        "analyze_images",
+        lambda images, top_k, min_conf: [
+            (
+                [Prediction(label="cat", confidence=91.0)],
+                [Prediction(label="cat", confidence=91.0)],
+                "ok",
+            )
+            for _ in images
+        ],
+    )
+
+    buffer = BytesIO()
+    Image.new("RGB", (32, 32)).save(buffer, "PNG")
+    response = client.post(
+        "/predict/batch",
+        headers=headers,
+        files=[
+            ("files", ("a.png", buffer.getvalue(), "image/png")),
+            ("files", ("b.txt", b"not-an-image", "text/plain")),
+            ("files", ("c.png", buffer.getvalue(), "image/png")),
+        ],
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [item["filename"] for item in results] == ["a.png", "b.txt", "c.png"]
+    assert results[0]["predictions"][0]["label_raw"] == "cat"
+    assert results[1]["error"] == "File bukan gambar valid."
+
+    history = client.get("/history", headers=headers).json()
+    assert history["total"] == 2
+
+    first = client.get("/history?limit=1", headers=headers).json()
+    assert first["rows"][0]["filename"] == "c.png"
+    second = client.get(
+        f"/history?limit=1&before_id={first['next_before_id']}", headers=headers
+    ).json()
+    assert second["rows"][0]["filename"] == "a.png"
+    assert second["total"] == 2
@@ -1,11 +1,18 @@
+import sqlite3
 from pathlib import Path
 
+import jwt
+import pytest
+
 from src.auth import (
     AuthRepository,
     create_access_token,
     create_refresh_token,
+    create_token_pair,
     decode_access_token,
+    _hash_password_pbkdf2,
     hash_password,
+    password_needs_rehash,
     verify_password,
 )
 
@@ -14,6 +21,44 @@ def test_password_hash_and_verify():
     encoded = hash_password("secret123")
     assert verify_password("secret123", encoded)
     assert not verify_password("wrong", encoded)
+    assert encoded.startswith("$argon2id$")
+    assert not password_needs_rehash(encoded)
+
+
+def test_verify_password_rejects_malformed_legacy_hash(monkeypatch):
+    import src.auth as auth
+
+    def fail_pbkdf2(*args, **kwargs):
+        raise AssertionError("PBKDF2 tidak boleh dijalankan untuk hash rusak")
+
+    monkeypatch.setattr(auth.hashlib, "pbkdf2_hmac", fail_pbkdf2)
+    assert not verify_password("secret123", "")
+    assert not verify_password("secret123", "abcd$1234")
+    assert not verify_password("secret123", "$" + "00" * 32)
+
+
+def test_legacy_pbkdf2_hash_is_upgraded_on_login(tmp_path: Path):
+    db_path = tmp_path / "history.db"
+    repo = AuthRepository(str(db_path))
+    user = repo.create_user("dave", "password123")
+
+    legacy = _hash_password_pbkdf2("password123")
+    assert verify_password("password123", legacy)
+    assert password_needs_rehash(legacy)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "UPDATE users SET password_hash = ? WHERE id = ?", (legacy, user["id"])
+        )
+
+    assert repo.authenticate("dave", "wrong-password") is None
+    assert repo.authenticate("dave", "password123") is not None
+
+    with sqlite3.connect(db_path) as conn:
+        stored = conn.execute(
+            "SELECT password_hash FROM users WHERE id = ?", (user["id"],)
+        ).fetchone()[0]
+    assert stored.startswith("$argon2id$")
+    assert repo.authenticate("dave", "password123") is not None
 
 
 def test_auth_repository_create_and_authenticate(tmp_path: Path):
@@ -65,3 +110,120 @@ def test_refresh_token_and_revocation(tmp_path: Path):
     assert not repo.is_token_revoked(jti)
     repo.revoke_token(jti)
     assert repo.is_token_revoked(jti)
+
+
+def test_decode_access_token_rejects_expired_cached_token(monkeypatch):
+    import src.auth as auth
+
+    token = create_access_token(user_id=12, role="user", expires_minutes=1)
+    payload = decode_access_token(token)
+
+    def fail_decode(*args, **kwargs):
+        raise AssertionError("jwt.decode tidak boleh dipanggil ulang")
+
+    monkeypatch.setattr(auth.jwt, "decode", fail_decode)
+    monkeypatch.setattr(auth.time, "time", lambda: payload["exp"] + 1)
+    with pytest.raises(jwt.ExpiredSignatureError):
+        decode_access_token(token)
+
+
+def test_role_update_visible_across_repositories(tmp_path: Path):
+    db_path = str(tmp_path / "history.db")
+    repo = AuthRepository(db_path)
+    other = AuthRepository(db_path)
+    user = repo.create_user("carol", "password123")
+
+    assert other.get_user_by_id(user["id"])["role"] == "user"
+    repo.update_role(user["id"], "admin")
+    assert repo.get_user_by_id(user["id"])["role"] == "admin"
+    assert other.get_user_by_id(user["id"])["role"] == "admin"
+
+
+def test_create_token_pair():
+    access, refresh = create_token_pair(user_id=13, role="user")
+    access_payload = decode_access_token(access)
+    refresh_payload = decode_access_token(refresh)
+    assert access_payload["typ"] == "access"
+    assert refresh_payload["typ"] == "refresh"
+    assert access_payload["sub"] == refresh_payload["sub"] == "13"
+    assert access_payload["jti"] != refresh_payload["jti"]
+    assert refresh_payload["exp"] > access_payload["exp"]
+
+
+def test_list_users_with_total(tmp_path: Path):
+    repo = AuthRepository(str(tmp_path / "history.db"))
+    for name in ("user01", "user02", "user03"):
+        repo.create_user(name, "password123")
+
+    users, total = repo.list_users_with_total(limit=2, offset=0)
+    assert [user["username"] for user in users] == ["user01", "user02"]
+    assert total == 3
+
+    users, total = repo.list_users_with_total(limit=2, offset=10)
+    assert users == []
+    assert total == 3
+
+
+def test_revoked_tokens_persist_across_instances(tmp_path: Path):
+    db_path = tmp_path / "history.db"
+    first = AuthRepository(str(db_path))
+    first.revoke_token("jti-1")
+    assert first.is_token_revoked("jti-1")
+    assert not first.is_token_revoked("jti-2")
+    first.close()
+
+    second = AuthRepository(str(db_path))
+    assert second.is_token_revoked("jti-1")
+    assert not second.is_token_revoked("jti-2")
+
+
+def test_decode_access_token_reuses_cached_payload(monkeypatch):
+    import src.auth as auth
+
+    token = create_access_token(user_id=21, role="user")
+    first = decode_access_token(token)
+
+    def fail_decode(*args, **kwargs):
+        raise AssertionError("jwt.decode tidak boleh dipanggil ulang")
+
+    monkeypatch.setattr(auth.jwt, "decode", fail_decode)
+    assert decode_access_token(token) == first
+
+
+def test_expired_revocations_are_pruned(tmp_path: Path):
+    import time
+
+    db_path = tmp_path / "history.db"
+    repo = AuthRepository(str(db_path))
+    repo.revoke_token("old-jti", expires_at=int(time.time()) - 10)
+    repo.revoke_token("live-jti", expires_at=int(time.time()) + 3600)
+    repo.close()
+
+    with sqlite3.connect(db_path) as conn:
+        stored = {row[0] for row in conn.execute("SELECT jti FROM revoked_tokens")}
+    assert stored == {"live-jti"}
+
+    reloaded = AuthRepository(str(db_path))
+    assert reloaded.is_token_revoked("live-jti")
+    assert not reloaded.is_token_revoked("old-jti")
+
+
+def test_revocation_is_visible_across_repositories_immediately(tmp_path: Path):
+    db_path = str(tmp_path / "history.db")
+    first = AuthRepository(db_path)
+    second = AuthRepository(db_path)
+    assert not second.is_token_revoked("shared-jti")
+
+    first.revoke_token("shared-jti")
+    assert second.is_token_revoked("shared-jti")
+    first.close()
+    second.close()
+
+
+def test_auth_repository_on_plain_memory_path():
+    repo = AuthRepository(":memory:")
+    repo.create_user("memuser", "password123")
+    assert repo.authenticate("memuser", "password123") is not None
+    repo.revoke_token("mem-jti")
+    assert repo.is_token_revoked("mem-jti")
+    repo.close()
@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+import torch
+
+from src.batching import InferenceBatcher
+
+
+def _fake_runner(calls):
+    def runner(batch: torch.Tensor) -> torch.Tensor:
+        calls.append(batch.shape[0])
+        return batch.flatten(start_dim=1)[:, :4]
+
+    return runner
+
+
+def test_batcher_groups_concurrent_requests():
+    calls = []
+    batcher = InferenceBatcher(_fake_runner(calls), max_batch_size=8, max_wait_ms=50)
+
+    async def scenario():
+        tensors = [torch.full((3, 2, 2), float(i)) for i in range(3)]
+        results = await asyncio.gather(*(batcher.submit(t) for t in tensors))
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(scenario())
+    assert calls == [3]
+    assert [float(row[0]) for row in results] == [0.0, 1.0, 2.0]
+
+
+def test_batcher_respects_max_batch_size():
+    calls = []
+    batcher = InferenceBatcher(_fake_runner(calls), max_batch_size=2, max_wait_ms=50)
+
+    async def scenario():
+        tensors = [torch.zeros((3, 2, 2)) for _ in range(5)]
+        await asyncio.gather(*(batcher.submit(t) for t in tensors))
+        await batcher.stop()
+
+    asyncio.run(scenario())
+    assert calls == [2, 2, 1]
+
+
+def test_batcher_propagates_runner_error():
+    def failing_runner(batch: torch.Tensor) -> torch.Tensor:
+        raise RuntimeError("boom")
+
+    batcher = InferenceBatcher(failing_runner, max_batch_size=4, max_wait_ms=1)
+
+    async def scenario():
+        try:
+            await batcher.submit(torch.zeros((3, 2, 2)))
+        finally:
+            await batcher.stop()
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(scenario())
+
+
+def test_batcher_raises_min_batch_when_backlog_grows():
+    batcher = InferenceBatcher(
+        _fake_runner([]), max_batch_size=4, max_wait_ms=1, control_interval_s=0.0
+    )
+    batcher._arrivals = 10
+    batcher._completed = 2
+    batcher._window_started -= 1.0
+    batcher._adjust_min_batch()
+    assert batcher.min_batch == 2
+
+    batcher.min_batch = 4
+    batcher._arrivals = 10
+    batcher._window_started -= 1.0
+    batcher._adjust_min_batch()
+    assert batcher.min_batch == 4
+
+
+def test_batcher_lowers_min_batch_when_idle():
+    batcher = InferenceBatcher(
+        _fake_runner([]), max_batch_size=4, max_wait_ms=1, control_interval_s=0.0
+    )
+    batcher.min_batch = 3
+    batcher._arrivals = 5
+    batcher._completed = 5
+    batcher._window_started -= 1.0
+    batcher._adjust_min_batch()
+    assert batcher.min_batch == 2
+    assert batcher.metrics() == {
+        "pending_requests": 0,
+        "current_min_batch": 2,
+        "max_batch_size": 4,
+    }
+
+
+def test_batcher_waits_until_deadline_when_min_batch_raised():
+    calls = []
+    batcher = InferenceBatcher(_fake_runner(calls), max_batch_size=8, max_wait_ms=100)
+    batcher.min_batch = 2
+
+    async def scenario():
+        first = asyncio.ensure_future(batcher.submit(torch.zeros((3, 2, 2))))
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(batcher.submit(torch.zeros((3, 2, 2))))
+        await asyncio.sleep(0.01)
+        third = asyncio.ensure_future(batcher.submit(torch.zeros((3, 2, 2))))
+        await asyncio.gather(first, second, third)
+        await batcher.stop()
+
+    asyncio.run(scenario())
+    assert calls == [3]
+
+
+def test_batcher_decays_min_batch_while_idle():
+    batcher = InferenceBatcher(
+        _fake_runner([]), max_batch_size=4, max_wait_ms=1, control_interval_s=0.01
+    )
+    batcher.min_batch = 4
+
+    async def scenario():
+        batcher.start()
+        await asyncio.sleep(0.2)
+        await batcher.stop()
+
+    asyncio.run(scenario())
+    assert batcher.min_batch == 1
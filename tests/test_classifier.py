@@ -1,4 +1,8 @@
-from src.classifier import Prediction, generate_insight
+from io import BytesIO
+
+from PIL import Image
+
+from src.classifier import Prediction, decode_image, generate_insight
 
 
 def test_generate_insight_high_confidence():
@@ -19,3 +23,117 @@ def test_generate_insight_low_confidence():
     text = generate_insight(predictions)
     assert "masih ragu" in text
     assert "ambigu" in text
+
+
+def test_decode_image_downscales_large_jpeg():
+    buffer = BytesIO()
+    Image.new("RGB", (2000, 1200), (10, 20, 30)).save(buffer, "JPEG")
+    image = decode_image(buffer.getvalue())
+    assert image.mode == "RGB"
+    assert 232 <= min(image.size) < 1200
+
+
+def test_decode_image_converts_rgba_png():
+    buffer = BytesIO()
+    Image.new("RGBA", (64, 64), (10, 20, 30, 128)).save(buffer, "PNG")
+    image = decode_image(buffer.getvalue())
+    assert image.mode == "RGB"
+    assert image.size == (64, 64)
+
+
+def test_decode_image_accepts_file_object():
+    buffer = BytesIO()
+    Image.new("RGB", (40, 30)).save(buffer, "PNG")
+    buffer.seek(0)
+    image = decode_image(buffer)
+    assert image.size == (40, 30)
+
+
+def test_analyze_images_runs_one_forward_pass(monkeypatch):
+    import torch
+
+    from src import classifier
+
+    calls = []
+
+    def fake_model(batch):
+        calls.append(batch.shape[0])
+        logits = torch.zeros(batch.shape[0], 1000)
+        logits[:, 281] = 10.0
+        return logits
+
+    monkeypatch.setattr(classifier, "load_model", lambda: fake_model)
+    images = [Image.new("RGB", (64, 48)), Image.new("RGB", (32, 32))]
+    results = classifier.analyze_images(images, top_k=3, min_conf=50.0)
+
+    assert calls == [2]
+    assert len(results) == 2
+    predictions, filtered, insight = results[0]
+    assert len(predictions) == 3
+    assert predictions[0].label == "tabby"
+    assert [item.label for item in filtered] == ["tabby"]
+    assert "tabby" in insight
+
+
+def test_optimize_for_inference_matches_eager_model():
+    import torch
+    from torchvision import models
+
+    from src.classifier import optimize_for_inference
+
+    model = models.resnet18(weights=None).eval()
+    batch = torch.randn(2, 3, 224, 224)
+    with torch.inference_mode():
+        expected = model(batch)
+
+    optimized = optimize_for_inference(model)
+    with torch.inference_mode():
+        actual = optimized(batch.contiguous(memory_format=torch.channels_last))
+    assert torch.allclose(actual, expected, atol=1e-4)
+
+
+def test_top_predictions_batch_matches_single_row():
+    import torch
+
+    from src.classifier import top_predictions, top_predictions_batch
+
+    probs = torch.softmax(torch.randn(3, 1000), dim=1)
+    expected = [top_predictions(row, top_k=4) for row in probs]
+
+    assert top_predictions_batch(probs.clone(), top_k=4) == expected
+
+
+def test_preprocess_image_matches_weight_transforms():
+    import torch
+
+    from src.classifier import _WEIGHT_TRANSFORMS, preprocess_image
+
+    image = Image.effect_noise((320, 240), 64).convert("RGB")
+    tensor = preprocess_image(image)
+
+    assert tensor.shape == (3, 224, 224)
+    assert tensor.dtype == torch.float32
+    assert torch.allclose(tensor, _WEIGHT_TRANSFORMS(image), atol=0.05)
+
+
+def test_preprocess_array_bgr_matches_pil_path():
+    import numpy as np
+    import torch
+
+    from src.classifier import preprocess_array, preprocess_image
+
+    frame = np.random.default_rng(0).integers(0, 256, (240, 320, 3), dtype=np.uint8)
+    expected = preprocess_image(Image.fromarray(frame[:, :, ::-1]))
+
+    assert torch.equal(preprocess_array(frame, bgr=True), expected)
+
+
+def test_summarize_predictions_shares_list_without_threshold():
+    from src.classifier import summarize_predictions
+
+    predictions = [Prediction(label="cat", confidence=70.0), Prediction("dog", 5.0)]
+    _, filtered, _ = summarize_predictions(predictions, min_conf=0.0)
+    assert filtered is predictions
+
+    _, filtered, _ = summarize_predictions(predictions, min_conf=10.0)
+    assert filtered == [predictions[0]]
@@ -0,0 +1,125 @@
+from pathlib import Path
+import sqlite3
+
+import pytest
+
+from src.db import ConnectionPool
+
+
+def test_pool_writer_commit_visible_to_reader(tmp_path: Path):
+    pool = ConnectionPool(tmp_path / "pool.db", readers=2)
+    with pool.writer() as conn:
+        conn.execute("CREATE TABLE items (name TEXT)")
+        conn.execute("INSERT INTO items VALUES ('a')")
+
+    with pool.reader() as conn:
+        rows = conn.execute("SELECT name FROM items").fetchall()
+        mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        temp_store = conn.execute("PRAGMA temp_store").fetchone()[0]
+        cache_size = conn.execute("PRAGMA cache_size").fetchone()[0]
+    assert rows == [("a",)]
+    assert mode == "wal"
+    assert temp_store == 2
+    assert cache_size == -20000
+    pool.close()
+
+
+def test_pool_writer_rolls_back_on_error(tmp_path: Path):
+    pool = ConnectionPool(tmp_path / "pool.db", readers=1)
+    with pool.writer() as conn:
+        conn.execute("CREATE TABLE items (name TEXT)")
+
+    with pytest.raises(RuntimeError):
+        with pool.writer() as conn:
+            conn.execute("INSERT INTO items VALUES ('a')")
+            raise RuntimeError("fail")
+
+    with pool.reader() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 0
+    pool.close()
+
+
+def test_pool_writer_rolls_back_when_commit_fails(tmp_path: Path):
+    pool = ConnectionPool(tmp_path / "pool.db", readers=1)
+    with pool.writer() as conn:
+        conn.execute("CREATE TABLE parent (id INTEGER PRIMARY KEY)")
+        conn.execute(
+            "CREATE TABLE child (parent_id INTEGER REFERENCES parent(id) "
+            "DEFERRABLE INITIALLY DEFERRED)"
+        )
+    conn.execute("PRAGMA foreign_keys=ON")
+
+    # Constraint deferred baru dicek saat COMMIT.
+    with pytest.raises(sqlite3.IntegrityError):
+        with pool.writer() as conn:
+            conn.execute("INSERT INTO child VALUES (1)")
+    assert not conn.in_transaction
+
+    with pool.writer() as conn:
+        conn.execute("INSERT INTO parent VALUES (1)")
+        conn.execute("INSERT INTO child VALUES (1)")
+    with pool.reader() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM child").fetchone()[0] == 1
+    pool.close()
+
+
+def test_pool_reuses_reader_connections(tmp_path: Path):
+    pool = ConnectionPool(tmp_path / "pool.db", readers=1)
+    with pool.reader() as first:
+        pass
+    with pool.reader() as second:
+        pass
+    assert first is second
+    pool.close()
+
+
+def test_pool_close_allows_reopen(tmp_path: Path):
+    pool = ConnectionPool(tmp_path / "pool.db", readers=1)
+    with pool.writer() as conn:
+        conn.execute("CREATE TABLE items (name TEXT)")
+    with pool.reader() as conn:
+        conn.execute("SELECT COUNT(*) FROM items").fetchone()
+    pool.close()
+
+    with pool.writer() as conn:
+        conn.execute("INSERT INTO items VALUES ('a')")
+    with pool.reader() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 1
+    pool.close()
+
+
+def test_pool_close_closes_checked_out_readers(tmp_path: Path):
+    pool = ConnectionPool(tmp_path / "pool.db", readers=1)
+    with pool.writer() as conn:
+        conn.execute("CREATE TABLE items (name TEXT)")
+
+    with pool.reader() as borrowed:
+        pool.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        borrowed.execute("SELECT 1")
+
+    with pool.reader() as conn:
+        assert conn is not borrowed
+        assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 0
+    pool.close()
+
+
+def test_pool_skips_file_pragmas_for_memory_db():
+    pool = ConnectionPool(":memory:", readers=1)
+    assert pool.in_memory
+    with pool.writer() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "memory"
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+    pool.close()
+
+
+def test_pool_shares_named_memory_db_between_connections():
+    pool = ConnectionPool("file:pool-shared?mode=memory&cache=shared", readers=1)
+    assert pool.in_memory
+    with pool.writer() as conn:
+        conn.execute("CREATE TABLE items (name TEXT)")
+        conn.execute("INSERT INTO items VALUES ('a')")
+    with pool.reader() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 1
+    pool.close()
+
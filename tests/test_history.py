@@ -109,3 +109,179 @@ def test_history_repository_creates_indexes(tmp_path: Path):
     assert "idx_prediction_history_source" in index_names
     assert "idx_prediction_history_top_label" in index_names
     assert "idx_prediction_history_user_id" in index_names
+    assert "idx_prediction_history_recent" not in index_names
+    assert "idx_prediction_history_user_recent" in index_names
+
+
+def test_history_list_recent_uses_covering_index(tmp_path: Path):
+    db_path = tmp_path / "history.db"
+    HistoryRepository(str(db_path))
+
+    with sqlite3.connect(db_path) as conn:
+        plain = conn.execute(
+            """
+            EXPLAIN QUERY PLAN
+            SELECT timestamp, filename, top_label, top_confidence, source
+            FROM prediction_history ORDER BY id DESC LIMIT 10
+            """
+        ).fetchall()
+        per_user = conn.execute(
+            """
+            EXPLAIN QUERY PLAN
+            SELECT timestamp, filename, top_label, top_confidence, source
+            FROM prediction_history WHERE user_id = ? ORDER BY id DESC LIMIT 10
+            """,
+            (1,),
+        ).fetchall()
+
+    assert plain[-1][3] == "SCAN prediction_history"
+    assert "COVERING INDEX idx_prediction_history_user_recent" in per_user[-1][3]
+
+
+def test_history_repository_add_many(tmp_path: Path):
+    db_path = tmp_path / "history.db"
+    repo = HistoryRepository(str(db_path))
+
+    repo.add_many(
+        [
+            {
+                "timestamp": "2026-02-14T10:00:00",
+                "filename": "a.jpg",
+                "top_label": "cat",
+                "top_confidence": 90.0,
+                "source": "api",
+                "top_predictions": [{"label": "cat", "confidence": 90.0}],
+                "user_id": 1,
+            },
+            {
+                "timestamp": "2026-02-14T10:00:01",
+                "filename": "b.jpg",
+                "top_label": "dog",
+                "top_confidence": 80.0,
+                "source": "api",
+            },
+        ]
+    )
+    repo.add_many([])
+
+    rows = repo.list_recent(limit=10, include_predictions=True)
+    assert [row["filename"] for row in rows] == ["b.jpg", "a.jpg"]
+    assert rows[1]["top_predictions"][0]["label"] == "cat"
+    assert rows[0]["top_predictions"] == []
+    assert repo.count(user_id=1) == 1
+
+
+def test_history_repository_list_recent_with_total(tmp_path: Path):
+    repo = HistoryRepository(str(tmp_path / "history.db"))
+    for idx in range(3):
+        repo.add(
+            timestamp=f"2026-02-14T10:0{idx}:00",
+            filename=f"sample{idx}.jpg",
+            top_label="cat",
+            top_confidence=80.0,
+            source="api",
+        )
+
+    rows, total = repo.list_recent_with_total(limit=2)
+    assert len(rows) == 2
+    assert total == 3
+
+    rows, total = repo.list_recent_with_total(limit=2, offset=5)
+    assert rows == []
+    assert total == 3
+
+    rows, total = repo.list_recent_with_total(limit=2, source="missing")
+    assert rows == []
+    assert total == 0
+
+
+def test_history_keyset_pagination(tmp_path: Path):
+    repo = HistoryRepository(str(tmp_path / "history.db"))
+    repo.add_many(
+        [
+            {
+                "timestamp": f"2026-02-14T10:00:{idx:02d}",
+                "filename": f"{idx}.jpg",
+                "top_label": "cat",
+                "top_confidence": 90.0,
+                "source": "api_image",
+            }
+            for idx in range(5)
+        ]
+    )
+
+    first, total = repo.list_recent_with_total(limit=2)
+    assert [row["filename"] for row in first] == ["4.jpg", "3.jpg"]
+    assert total == 5
+
+    second, total = repo.list_recent_with_total(limit=2, before_id=first[-1]["id"])
+    assert [row["filename"] for row in second] == ["2.jpg", "1.jpg"]
+    assert total == 5
+
+    last = repo.list_recent(limit=2, before_id=second[-1]["id"])
+    assert [row["filename"] for row in last] == ["0.jpg"]
+
+
+def test_history_label_filter_uses_normalized_key(tmp_path: Path):
+    db_path = tmp_path / "history.db"
+    repo = HistoryRepository(str(db_path))
+    repo.add(
+        timestamp="2026-02-14T10:00:00",
+        filename="a.jpg",
+        top_label="Persian cat",
+        top_confidence=80.0,
+        source="api",
+    )
+    repo.close()
+
+    # Baris tanpa top_label_key (mis. dari versi lama) diisi saat init.
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            """
+            INSERT INTO prediction_history
+            (timestamp, filename, top_label, top_confidence, source)
+            VALUES ('2026-02-14T10:01:00', 'b.jpg', 'Persian cat', 70.0, 'api')
+            """
+        )
+    repo = HistoryRepository(str(db_path))
+
+    assert repo.count(label="persian") == 2
+    assert repo.count(label="PERSIAN CAT") == 2
+    assert repo.count(label="cat") == 0
+
+    with sqlite3.connect(db_path) as conn:
+        plan = conn.execute(
+            """
+            EXPLAIN QUERY PLAN
+            SELECT COUNT(*) FROM prediction_history
+            WHERE top_label_key >= ? AND top_label_key < ?
+            """,
+            ("persian", "persian\uffff"),
+        ).fetchall()
+    assert "idx_prediction_history_top_label_key" in plan[-1][3]
+
+
+def test_history_predictions_json_fallback_matches_orjson(tmp_path: Path, monkeypatch):
+    import src.history as history
+
+    predictions = [{"label": "kucing", "confidence": 91.25}]
+    encoded = history._dumps_predictions(predictions)
+    assert json.loads(encoded) == predictions
+
+    monkeypatch.setattr(history, "orjson", None)
+    assert history._loads_predictions(encoded) == predictions
+    assert json.loads(history._dumps_predictions(predictions)) == predictions
+
+
+def test_history_repository_on_plain_memory_path():
+    repo = HistoryRepository(":memory:")
+    repo.add(
+        timestamp="2026-02-14T10:00:00",
+        filename="mem.jpg",
+        top_label="cat",
+        top_confidence=70.0,
+        source="test",
+    )
+    rows = repo.list_recent(limit=5)
+    assert [row["filename"] for row in rows] == ["mem.jpg"]
+    repo.close()
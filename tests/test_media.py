@@ -43,6 +43,8 @@ def test_is_youtube_url():
     assert is_youtube_url("https://www.youtube.com/watch?v=abc123")
     assert is_youtube_url("https://youtu.be/abc123")
     assert not is_youtube_url("https://example.com/video.mp4")
+    assert is_youtube_url("https://M.YouTube.com:443/watch?v=abc123")
+    assert not is_youtube_url("https://notyoutube.com/watch?v=abc123")
 
 
 def test_fetch_url_bytes_uses_youtube_downloader(monkeypatch):
@@ -116,3 +118,151 @@ def test_resolve_downloaded_video_path_fallback_scans_tmpdir(tmp_path: Path):
         tmpdir=str(tmp_path),
     )
     assert out == str(b)
+
+
+def test_analyze_video_stream_samples_frames(tmp_path: Path, monkeypatch):
+    cv2 = pytest.importorskip("cv2")
+    import numpy as np
+
+    from src.classifier import Prediction
+
+    video_path = tmp_path / "clip.mp4"
+    writer = cv2.VideoWriter(
+        str(video_path), cv2.VideoWriter_fourcc(*"mp4v"), 10, (32, 32)
+    )
+    for idx in range(10):
+        writer.write(np.full((32, 32, 3), idx * 20, dtype=np.uint8))
+    writer.release()
+
+    import torch
+
+    batch_sizes = []
+
+    def fake_run_model(batch):
+        batch_sizes.append(batch.shape[0])
+        probs = torch.zeros(batch.shape[0], 1000)
+        probs[:, 281] = 0.8
+        return probs
+
+    monkeypatch.setattr(media, "run_model", fake_run_model)
+
+    with open(video_path, "rb") as stream:
+        analyzed = media.analyze_video_stream(
+            stream,
+            top_k=3,
+            min_conf=0.0,
+            sample_every_n_frames=3,
+            max_sampled_frames=10,
+        )
+    assert analyzed.sampled_frames == 4
+    assert analyzed.total_frames == 10
+    assert batch_sizes == [4]
+    assert analyzed.predictions[0] == Prediction(label="tabby", confidence=80.0)
+
+
+def test_aggregate_predictions_averages_and_keeps_tie_order():
+    from src.classifier import Prediction
+
+    frames = [
+        [Prediction("cat", 80.0), Prediction("dog", 40.0), Prediction("fox", 30.0)],
+        [Prediction("dog", 60.0), Prediction("cat", 40.0), Prediction("owl", 50.0)],
+    ]
+
+    result = media._aggregate_predictions(frames, top_k=3)
+
+    assert result == [
+        Prediction("cat", 60.0),
+        Prediction("dog", 50.0),
+        Prediction("owl", 50.0),
+    ]
+
+
+def test_analyze_video_path_counts_frames_read_when_capped(tmp_path: Path, monkeypatch):
+    cv2 = pytest.importorskip("cv2")
+    import numpy as np
+    import torch
+
+    video_path = tmp_path / "clip.mp4"
+    writer = cv2.VideoWriter(
+        str(video_path), cv2.VideoWriter_fourcc(*"mp4v"), 10, (32, 32)
+    )
+    for idx in range(30):
+        writer.write(np.full((32, 32, 3), idx * 5, dtype=np.uint8))
+    writer.release()
+
+    monkeypatch.setattr(
+        media, "run_model", lambda batch: torch.ones(batch.shape[0], 1000) / 1000
+    )
+
+    analyzed = media.analyze_video_path(
+        str(video_path),
+        top_k=3,
+        min_conf=0.0,
+        sample_every_n_frames=5,
+        max_sampled_frames=2,
+    )
+    assert analyzed.sampled_frames == 2
+    # total_frames = frame yang dibaca sampai batas sampel tercapai (0..5).
+    assert analyzed.total_frames == 6
+
+
+@pytest.mark.parametrize("top_k, min_conf", [(0, 0.0), (3, 150.0)])
+def test_analyze_video_path_validates_before_opening(monkeypatch, top_k, min_conf):
+    cv2 = pytest.importorskip("cv2")
+
+    def fail_capture(*args, **kwargs):
+        raise AssertionError("video tidak boleh dibuka untuk parameter invalid")
+
+    monkeypatch.setattr(cv2, "VideoCapture", fail_capture)
+    with pytest.raises(ValueError):
+        media.analyze_video_path("clip.mp4", top_k=top_k, min_conf=min_conf)
+
+
+class _FakeResponse:
+    def __init__(self, body: bytes, headers: dict):
+        self._body = body
+        self.headers = headers
+        self.read_calls = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def geturl(self):
+        return "https://example.com/final.jpg"
+
+    def read(self, size=-1):
+        self.read_calls += 1
+        chunk, self._body = self._body[:size], self._body[size:]
+        return chunk
+
+
+def test_download_url_bytes_rejects_large_content_length(monkeypatch):
+    response = _FakeResponse(
+        b"x", {"Content-Length": str(media.MAX_DOWNLOAD_BYTES + 1)}
+    )
+    monkeypatch.setattr(media.urllib.request, "urlopen", lambda req, timeout: response)
+
+    with pytest.raises(ValueError):
+        media._download_url_bytes(url="https://example.com/a.jpg", timeout=5)
+    assert response.read_calls == 0
+
+
+def test_download_url_bytes_reads_body_in_chunks(monkeypatch):
+    body = b"a" * (media.VIDEO_COPY_BUFFER_BYTES + 10)
+    response = _FakeResponse(body, {"Content-Type": "image/jpeg"})
+    monkeypatch.setattr(media.urllib.request, "urlopen", lambda req, timeout: response)
+
+    content, content_type, final_url = media._download_url_bytes(
+        url="https://example.com/a.jpg", timeout=5
+    )
+    assert content == body
+    assert content_type == "image/jpeg"
+    assert final_url == "https://example.com/final.jpg"
+
+
+def test_looks_like_html_checks_bytes():
+    assert media._looks_like_html(b"\xff\xfe<!DOCTYPE HTML><HTML>")
+    assert not media._looks_like_html(b"\x89PNG\r\n\x1a\n" + b"\x00" * 2048 + b"<html")
@@ -1,4 +1,4 @@
-from src.translation import translate_label
+from src.translation import get_translation_table, translate_label
 
 
 def test_translate_label_id_known():
@@ -11,3 +11,10 @@ def test_translate_label_id_unknown_returns_raw():
 
 def test_translate_label_en_returns_raw():
     assert translate_label("cat", "en") == "cat"
+
+
+def test_get_translation_table_per_language():
+    assert get_translation_table("id")["cat"] == "kucing"
+    assert get_translation_table("en") == {}
+    assert get_translation_table("id") is get_translation_table("id")
+    assert get_translation_table("xx") is get_translation_table("yy")
@@ -1,3 +1,5 @@
+import pytest
+
 from src.classifier import Prediction
 from src.url_analyzer import analyze_url
 
@@ -5,15 +7,13 @@ from src.url_analyzer import analyze_url
 def test_analyze_url_webpage(monkeypatch):
     import src.url_analyzer as analyzer
 
-    monkeypatch.setattr(
-        analyzer,
-        "_download_url_resource",
-        lambda url, timeout: (
-            b"<html><head><title>Hello</title></head><body>Ini halaman web untuk testing konten.</body></html>",
-            "text/html",
-            url,
-        ),
-    )
+    def fake_download(url, timeout, dest):
+        dest.write(
+            b"<html><head><title>Hello</title></head><body>Ini halaman web untuk testing konten.</body></html>"
+        )
+        return "text/html", url
+
+    monkeypatch.setattr(analyzer, "_download_url_resource", fake_download)
 
     result = analyze_url(url="https://example.com/page", mode="auto")
     assert result.content_kind == "webpage"
@@ -24,11 +24,11 @@ def test_analyze_url_webpage(monkeypatch):
 def test_analyze_url_image(monkeypatch):
     import src.url_analyzer as analyzer
 
-    monkeypatch.setattr(
-        analyzer,
-        "_download_url_resource",
-        lambda url, timeout: (b"img", "image/png", url),
-    )
+    def fake_download(url, timeout, dest):
+        dest.write(b"img")
+        return "image/png", url
+
+    monkeypatch.setattr(analyzer, "_download_url_resource", fake_download)
     monkeypatch.setattr(
         analyzer,
         "analyze_image_bytes",
@@ -42,3 +42,97 @@ def test_analyze_url_image(monkeypatch):
     result = analyze_url(url="https://example.com/a.png", mode="auto")
     assert result.content_kind == "image"
     assert result.predictions[0].label == "cat"
+
+
+def test_analyze_url_video_is_analyzed_from_disk(monkeypatch):
+    import os
+
+    import src.url_analyzer as analyzer
+    from src.media import VideoAnalysis
+
+    def fake_download(url, timeout, dest):
+        dest.write(b"\x00\x00\x00\x18ftypmp42")
+        return "video/mp4", url
+
+    seen_paths = []
+
+    def fake_analyze_video_path(path, **kwargs):
+        seen_paths.append(path)
+        assert os.path.getsize(path) == 12
+        return VideoAnalysis(
+            predictions=[Prediction(label="cat", confidence=70.0)],
+            filtered=[],
+            insight="ok",
+            sampled_frames=3,
+            total_frames=30,
+        )
+
+    monkeypatch.setattr(analyzer, "_download_url_resource", fake_download)
+    monkeypatch.setattr(analyzer, "analyze_video_path", fake_analyze_video_path)
+
+    result = analyze_url(url="https://example.com/clip.mp4", mode="auto")
+    assert result.content_kind == "video"
+    assert result.total_frames == 30
+    assert not os.path.exists(seen_paths[0])
+
+
+def test_extract_webpage_text_strips_script_and_style():
+    from src.url_analyzer import _extract_webpage_text
+
+    title, text = _extract_webpage_text(
+        b"<html><head><title>Judul</title><style>p { color: red; }</style></head>"
+        b"<body><SCRIPT type='x'>var a = '<b>';</SCRIPT><p>Halo <b>dunia</b></p></body></html>"
+    )
+    assert title == "Judul"
+    assert text == "Judul Halo dunia"
+
+
+def _make_pdf(text: str) -> bytes:
+    # PDF minimal ditulis manual agar fixture tidak bergantung pada pymupdf.
+    lines = [
+        line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        for line in text.splitlines()
+    ]
+    content = "BT /F1 12 Tf 72 720 Td " + " 0 -16 Td ".join(
+        f"({line}) Tj" for line in lines
+    ) + " ET"
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+        "/Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>",
+        f"<< /Length {len(content)} >>\nstream\n{content}\nendstream",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref_at = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref_at}\n%%EOF\n"
+    ).encode()
+    return bytes(out)
+
+
+def test_extract_pdf_text_with_pymupdf():
+    pytest.importorskip("pymupdf")
+    from src.url_analyzer import _extract_pdf_text
+
+    raw = _make_pdf("Laporan   kucing\nuntuk pengujian")
+    assert _extract_pdf_text(raw) == "Laporan kucing untuk pengujian"
+
+
+def test_extract_pdf_text_falls_back_to_pypdf(monkeypatch):
+    import sys
+
+    from src.url_analyzer import _extract_pdf_text
+
+    raw = _make_pdf("Laporan   kucing\nuntuk pengujian")
+    monkeypatch.setitem(sys.modules, "pymupdf", None)
+    assert _extract_pdf_text(raw) == "Laporan kucing untuk pengujian"